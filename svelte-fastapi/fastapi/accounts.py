@@ -0,0 +1,32 @@
+from sqlalchemy.orm import Session
+
+# Database steps shared by the signup, login and password reset handlers of
+# employees and customers. Those handlers are async so they can await the
+# password hash pool (security.security); they call these blocking helpers
+# through run_in_threadpool.
+
+def find_account(db: Session, model, email: str):
+    return db.query(model).filter(model.email == email).first()
+
+def save_account(db: Session, account):
+    db.add(account)
+    db.commit()
+    db.refresh(account)
+
+def activate_account(db: Session, account):
+    account.is_active = "Active"
+    db.commit()
+    db.refresh(account)
+
+def find_reset(db: Session, token: str, token_model, user_model, user_key: str):
+    """(reset token row, its user), either None when missing; user_key is the token's user id column"""
+    reset = db.query(token_model).filter(token_model.token == token).first()
+    if not reset:
+        return None, None
+    user = db.query(user_model).filter(user_model.id == getattr(reset, user_key)).first()
+    return reset, user
+
+def apply_reset(db: Session, reset, user, password_hash: str):
+    user.password = password_hash
+    db.delete(reset)
+    db.commit()
@@ -2,7 +2,8 @@ from datetime import datetime, timedelta
 import os
 from typing import Annotated, Optional
 from fastapi.responses import JSONResponse
-from passlib.hash import argon2 
+from starlette.concurrency import run_in_threadpool
+from security.security import hash_password_async, verify_password_async
 from fastapi import APIRouter, Body, HTTPException, Depends
 from sqlalchemy import func
 from sqlalchemy.orm import Session
@@ -18,6 +19,8 @@ from apis.login.schema import AccountSchema, RefreshTokenRequest
 from sqlalchemy.orm import load_only
 from jose import JWTError, jwt
 from apis.login.models import AdminBase
+from counters import table_count
+from accounts import activate_account, find_account, save_account
 router = APIRouter(tags=["Customers"])
 
 def get_db():
@@ -39,8 +42,8 @@ def get_account(current_user: dict = Depends(get_current_user)):
     return current_user
 
 @router.post("/signup")
-def sign_up(account_info: CustomerSignUpSchema, db: Session = Depends(get_db)):
-    existing = db.query(CustomerBase).filter(CustomerBase.email == account_info.email).first()
+async def sign_up(account_info: CustomerSignUpSchema, db: Session = Depends(get_db)):
+    existing = await run_in_threadpool(find_account, db, CustomerBase, account_info.email)
     if existing:
         raise HTTPException(status_code=StatusCode.HTTP_BAD_REQUEST_400, detail="Customer already exists!")
     if account_info.password != account_info.confirmPassword:
@@ -49,32 +52,28 @@ def sign_up(account_info: CustomerSignUpSchema, db: Session = Depends(get_db)):
         id=str(uuid.uuid4()),
         email=account_info.email,
         customer_name=account_info.customer_name,
-        password=argon2.hash(account_info.password),
+        password=await hash_password_async(account_info.password),
         phone=account_info.phone,
         address=account_info.address,
         created_at=datetime.utcnow(),
         is_active = 'Inactive',
         role = 'CUSTOMER'
     )
-    db.add(account)
-    db.commit()
-    db.refresh(account)
+    await run_in_threadpool(save_account, db, account)
 
     return {"message": "✅ Sign up successfully"}
 
 # === Login ===
 @router.post("/login")
-def login(customer_info: AccountSchema, db: Session = Depends(get_db)):
-    customer = db.query(CustomerBase).filter(CustomerBase.email == customer_info.email).first()
+async def login(customer_info: AccountSchema, db: Session = Depends(get_db)):
+    customer = await run_in_threadpool(find_account, db, CustomerBase, customer_info.email)
     if not customer:
         raise HTTPException(status_code=StatusCode.HTTP_ERROR_404.value, detail="Incorrect email or password!")
     
-    if not argon2.verify(customer_info.password, customer.password):
+    if not await verify_password_async(customer_info.password, customer.password):
         raise HTTPException(status_code=StatusCode.HTTP_UNAUTHORIZE_401.value, detail="Incorrect email or password!")
 
-    customer.is_active = "Active"
-    db.commit()
-    db.refresh(customer)
+    await run_in_threadpool(activate_account, db, customer)
 
     tokens = handle_login_role(customer)
 
@@ -136,7 +135,7 @@ def get_customers(
     else:
         next_cursor_value = None
 
-    total = db.query(CustomerBase).count()
+    total = table_count(db, CustomerBase)
 
     return {
         "search_result": customers,
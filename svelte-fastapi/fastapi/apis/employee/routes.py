@@ -13,6 +13,7 @@ from .schema import EmployeeSchema, SuccessMessageSchema, EmployeeInputSchema, S
 from sqlalchemy.orm import Session
 from database import SessionLocal
 from sqlalchemy.orm import load_only
+from counters import table_count
 router = APIRouter(tags=["Employees"])
 
 def get_db():
@@ -87,7 +88,7 @@ def search_employee(
     
     # Get paginated results
     employees = query.limit(limit).all()
-    total_employee = db.query(AdminBase).count()
+    total_employee = table_count(db, AdminBase)
 
     # --- Compute next_cursor ---
     next_cursor_value = None
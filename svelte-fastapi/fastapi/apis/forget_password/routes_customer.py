@@ -7,8 +7,10 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from dotenv import load_dotenv
 from database import SessionLocal
+from accounts import apply_reset, find_reset
 from apis.customer.models import CustomerBase
-from .utils import generate_token, hash_password
+from starlette.concurrency import run_in_threadpool
+from .utils import generate_token, hash_password_async
 from .models import PasswordResetTokenCustomerBase
 from .schema import RequestEmail, ResetPasswordRequestPayload
 from apis.customer.models import CustomerBase
@@ -56,16 +58,16 @@ def forget_password(request: RequestEmail, db: Session = Depends(get_db)):
     }
 
 @customer_router.post("/reset_password")
-def reset_password(request: ResetPasswordRequestPayload, db: Session = Depends(get_db)):
+async def reset_password(request: ResetPasswordRequestPayload, db: Session = Depends(get_db)):
     new_password = request.new_password
     confirm_password = request.confirm_password
     
     if new_password != confirm_password:
         raise HTTPException(status_code=StatusCode.HTTP_BAD_REQUEST_400, detail="Passwords do not match")
 
-    reset = db.query(PasswordResetTokenCustomerBase).filter(
-        PasswordResetTokenCustomerBase.token == request.token
-    ).first()
+    reset, user = await run_in_threadpool(
+        find_reset, db, request.token, PasswordResetTokenCustomerBase, CustomerBase, "customer_id"
+    )
 
     if not reset:
         raise HTTPException(status_code=StatusCode.HTTP_BAD_REQUEST_400, detail="Invalid token")
@@ -73,16 +75,10 @@ def reset_password(request: ResetPasswordRequestPayload, db: Session = Depends(g
     if reset.expires_at < datetime.utcnow():
         raise HTTPException(status_code=StatusCode.HTTP_BAD_REQUEST_400, detail="Token expired")
 
-    user = db.query(CustomerBase).filter(
-        CustomerBase.id == reset.customer_id
-    ).first()
-
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    user.password = hash_password(new_password)
-    db.delete(reset)
-    db.commit()
+    await run_in_threadpool(apply_reset, db, reset, user, await hash_password_async(new_password))
 
     return {"message": "Password reset successfully"}
 
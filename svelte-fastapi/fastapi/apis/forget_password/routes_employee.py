@@ -7,8 +7,10 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from dotenv import load_dotenv
 from database import SessionLocal
+from accounts import apply_reset, find_reset
 from apis.login.models import AdminBase
-from .utils import generate_token, hash_password
+from starlette.concurrency import run_in_threadpool
+from .utils import generate_token, hash_password_async
 from .models import PasswordResetTokenEmployeeBase
 from .schema import RequestEmail, ResetPasswordRequestPayload
 employee_router = APIRouter(prefix="/employee", tags=["Authentication"])
@@ -47,16 +49,16 @@ def forget_password(request: RequestEmail, db: Session = Depends(get_db)):
     }
 
 @employee_router.post("/reset_password")
-def reset_password(request: ResetPasswordRequestPayload, db: Session = Depends(get_db)):
+async def reset_password(request: ResetPasswordRequestPayload, db: Session = Depends(get_db)):
     new_password = request.new_password
     confirm_password = request.confirm_password
     
     if new_password != confirm_password:
         raise HTTPException(status_code=400, detail="Passwords do not match")
 
-    reset = db.query(PasswordResetTokenEmployeeBase).filter(
-        PasswordResetTokenEmployeeBase.token == request.token
-    ).first()
+    reset, user = await run_in_threadpool(
+        find_reset, db, request.token, PasswordResetTokenEmployeeBase, AdminBase, "employee_id"
+    )
 
     if not reset:
         raise HTTPException(status_code=400, detail="Invalid token")
@@ -64,16 +66,10 @@ def reset_password(request: ResetPasswordRequestPayload, db: Session = Depends(g
     if reset.expires_at < datetime.utcnow():
         raise HTTPException(status_code=400, detail="Token expired")
 
-    user = db.query(AdminBase).filter(
-        AdminBase.id == reset.employee_id
-    ).first()
-
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    user.password = hash_password(new_password)
-    db.delete(reset)
-    db.commit()
+    await run_in_threadpool(apply_reset, db, reset, user, await hash_password_async(new_password))
 
     return {"message": "Password reset successfully"}
     
@@ -1,13 +1,14 @@
-from argon2 import PasswordHasher
 import uuid
-
-ph = PasswordHasher()
+from security import security
 
 def hash_password(password: str):
-    return ph.hash(password)
+    return security.hash_password(password)
+
+async def hash_password_async(password: str):
+    return await security.hash_password_async(password)
 
 def verify_password(hash, password):
-    return ph.verify(hash, password)
+    return security.verify_password(password, hash)
 
 def generate_token():
     return str(uuid.uuid4())
@@ -7,14 +7,16 @@ from fastapi import APIRouter, Body, Depends, HTTPException, Header
 from fastapi.responses import JSONResponse
 from jose import JWTError, jwt
 from sqlalchemy.orm import Session
-from passlib.hash import argon2 
+from starlette.concurrency import run_in_threadpool
+from security.security import hash_password_async, password_pool, verify_password_async
 from dotenv import load_dotenv
 from role import StatusCode
 from .models import AdminBase
 from apis.customer.models import CustomerBase
 from .schema import EmployeeSignUpSchema, AccountSchema, RefreshTokenRequest
 from database import SessionLocal
-from auth import ACCESS_TOKEN_EXPIRE_MINUTES, REFRESH_TOKEN_EXPIRE_DAYS, create_token, get_current_user, handle_login_role
+from accounts import activate_account, find_account, save_account
+from auth import ACCESS_TOKEN_EXPIRE_MINUTES, REFRESH_TOKEN_EXPIRE_DAYS, create_token, get_current_user, handle_login_role, require_admin
 from pydantic import BaseModel
 
 router = APIRouter(prefix='/auth', tags=["Authentication"])
@@ -36,8 +38,8 @@ logger = logging.getLogger(__name__)
 
 # Sign Up 
 @router.post("/signup")
-def sign_up(account_info: EmployeeSignUpSchema, db: Session = Depends(get_db)):
-    existing = db.query(AdminBase).filter(AdminBase.email == account_info.email).first()
+async def sign_up(account_info: EmployeeSignUpSchema, db: Session = Depends(get_db)):
+    existing = await run_in_threadpool(find_account, db, AdminBase, account_info.email)
     if existing:
         raise HTTPException(status_code=400, detail="Account is existed!")
     if account_info.password != account_info.confirmPassword:
@@ -47,30 +49,26 @@ def sign_up(account_info: EmployeeSignUpSchema, db: Session = Depends(get_db)):
         id=str(uuid.uuid4()),
         email=account_info.email,
         employee_name=account_info.employee_name,
-        password=argon2.hash(account_info.password), 
+        password=await hash_password_async(account_info.password), 
         role=account_info.role,
         created_at=datetime.utcnow(),
         is_active = 'Inactive'
     )
-    db.add(account)
-    db.commit()
-    db.refresh(account)
+    await run_in_threadpool(save_account, db, account)
 
     return {"message": "✅ Sign up successfully"}
 
 # Login
 @router.post("/login")
-def login(employee_info: AccountSchema, db: Session = Depends(get_db)):
-    employee = db.query(AdminBase).filter(AdminBase.email == employee_info.email).first()
+async def login(employee_info: AccountSchema, db: Session = Depends(get_db)):
+    employee = await run_in_threadpool(find_account, db, AdminBase, employee_info.email)
     if not employee:
         raise HTTPException(status_code=StatusCode.HTTP_ERROR_404.value, detail="Incorrect email or password!")
     
-    if not argon2.verify(employee_info.password, employee.password):
+    if not await verify_password_async(employee_info.password, employee.password):
         raise HTTPException(status_code=StatusCode.HTTP_UNAUTHORIZE_401.value, detail="Incorrect email or password!")
 
-    employee.is_active = "Active"
-    db.commit()
-    db.refresh(employee)
+    await run_in_threadpool(activate_account, db, employee)
 
     tokens = handle_login_role(employee)
 
@@ -137,4 +135,8 @@ def inactive_user_login(
     db.refresh(account)
     
     return {"message": "Log out successfully", "user_id": request.id}
-        
\ No newline at end of file
+        
+
+@router.get("/password-hash-stats")
+def get_password_hash_stats(_: dict = Depends(require_admin)):
+    return password_pool.stats()
@@ -0,0 +1,234 @@
+"""Automatic assignment of PENDING orders to employees.
+
+Each pass claims up to ASSIGN_BATCH_SIZE unassigned PENDING orders, oldest
+first, with SELECT ... FOR UPDATE SKIP LOCKED, so several schedulers (one per
+worker, or the standalone loop below) never pick the same order. The orders
+are then spread over the active EMPLOYEE accounts, least loaded first (load =
+open ASSIGNED/PROCESSING orders), with one UPDATE per employee, all in the
+pass's transaction.
+
+Employees can also pull work themselves with claim_orders() (POST
+/orders/claim). A self-claimed order that is still ASSIGNED after
+CLAIM_TIMEOUT_MINUTES goes back to the PENDING pool, released by the next
+claim or scheduler pass.
+
+The scheduler thread runs when ORDER_AUTO_ASSIGN=1 and can also be run on
+its own from the fastapi directory:
+    python -m apis.orders.assignment
+"""
+import heapq
+import logging
+import os
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+from sqlalchemy import func, update
+from sqlalchemy.orm import Session
+from database import SessionLocal
+from apis.login.models import AdminBase
+from apis.reports.service import apply_orders_rollups
+from .events import publish_order_event
+from .models import OrderBase
+
+AUTO_ASSIGN = os.getenv("ORDER_AUTO_ASSIGN") == "1"
+ASSIGN_INTERVAL = float(os.getenv("ORDER_AUTO_ASSIGN_INTERVAL", "5"))
+ASSIGN_BATCH_SIZE = 200
+CLAIM_TIMEOUT_MINUTES = int(os.getenv("ORDER_CLAIM_TIMEOUT_MINUTES", "30"))
+MAX_CLAIM = 50
+OPEN_STATUSES = ("ASSIGNED", "PROCESSING")
+LATENCY_SAMPLES = 1000
+# What publish_order_event reads, taken from each UPDATE with RETURNING
+CHANGE_COLUMNS = (OrderBase.id, OrderBase.status, OrderBase.employee_id)
+
+logger = logging.getLogger(__name__)
+
+class AssignmentMetrics:
+    def __init__(self):
+        self.runs = 0
+        self.assigned = 0
+        self.queue_depth = 0
+        self.last_run_at = None
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)  # seconds from order creation to assignment
+        self._lock = threading.Lock()
+
+    def record(self, queue_depth: int, latencies):
+        with self._lock:
+            self.runs += 1
+            self.assigned += len(latencies)
+            self.queue_depth = queue_depth
+            self.last_run_at = datetime.utcnow()
+            self._latencies.extend(latencies)
+
+    def snapshot(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+            stats = {
+                "runs": self.runs,
+                "assigned": self.assigned,
+                "queue_depth": self.queue_depth,
+                "last_run_at": self.last_run_at,
+            }
+        def percentile(p):
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))], 3) if latencies else None
+        stats["latency_seconds"] = {
+            "p50": percentile(0.5),
+            "p95": percentile(0.95),
+            "max": round(latencies[-1], 3) if latencies else None,
+        }
+        return stats
+
+metrics = AssignmentMetrics()
+
+def pending_queue(db: Session):
+    return db.query(OrderBase).filter(OrderBase.status == "PENDING", OrderBase.employee_id.is_(None))
+
+def claim_pending_orders(db: Session, limit: int):
+    """Lock up to limit unassigned PENDING orders, oldest first, skipping rows other transactions hold"""
+    return (
+        pending_queue(db)
+        .with_entities(OrderBase.id, OrderBase.created_at)
+        .order_by(OrderBase.created_at, OrderBase.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True, of=OrderBase)
+        .all()
+    )
+
+def employee_loads(db: Session):
+    """[(open orders, employee id, employee name)] for active employees"""
+    open_orders = func.count(OrderBase.id)
+    rows = (
+        db.query(AdminBase.id, AdminBase.employee_name, open_orders)
+        .outerjoin(OrderBase, (OrderBase.employee_id == AdminBase.id) & OrderBase.status.in_(OPEN_STATUSES))
+        .filter(AdminBase.role == "EMPLOYEE", AdminBase.is_active == "Active")
+        .group_by(AdminBase.id, AdminBase.employee_name)
+        .all()
+    )
+    return [(load, employee_id, name) for employee_id, name, load in rows]
+
+def plan_assignments(order_ids, loads):
+    """{employee id: [order ids]}, each order to the currently least-loaded employee"""
+    heap = list(loads)
+    heapq.heapify(heap)
+    plan = {}
+    for order_id in order_ids:
+        load, employee_id, name = heapq.heappop(heap)
+        plan.setdefault((employee_id, name), []).append(order_id)
+        heapq.heappush(heap, (load + 1, employee_id, name))
+    return plan
+
+def release_stale_claims(db: Session, timeout_minutes: int = CLAIM_TIMEOUT_MINUTES):
+    """Put self-claimed orders nobody started back into the pool; returns how many"""
+    cutoff = datetime.utcnow() - timedelta(minutes=timeout_minutes)
+    stale = [
+        row.id
+        for row in db.query(OrderBase.id)
+        .filter(OrderBase.status == "ASSIGNED", OrderBase.claimed_at < cutoff)
+        .with_for_update(skip_locked=True, of=OrderBase)
+        .all()
+    ]
+    if not stale:
+        db.rollback()
+        return 0
+    apply_orders_rollups(db, stale, -1)
+    released = db.execute(
+        update(OrderBase)
+        .where(OrderBase.id.in_(stale))
+        .values(employee_id=None, assigned_to=None, status="PENDING", claimed_at=None, updated_at=datetime.utcnow())
+        .returning(*CHANGE_COLUMNS)
+        .execution_options(synchronize_session=False)
+    ).all()
+    apply_orders_rollups(db, stale, 1)
+    db.commit()
+    for order in released:
+        publish_order_event("order.released", order)
+    return len(released)
+
+def claim_orders(db: Session, employee, n: int):
+    """Assign the next n pooled orders to employee; returns their ids, oldest first"""
+    release_stale_claims(db)
+    claimed = claim_pending_orders(db, n)
+    if not claimed:
+        db.rollback()
+        return []
+    order_ids = [order.id for order in claimed]
+    apply_orders_rollups(db, order_ids, -1)
+    now = datetime.utcnow()
+    assigned = db.execute(
+        update(OrderBase)
+        .where(OrderBase.id.in_(order_ids))
+        .values(employee_id=employee.id, assigned_to=employee.employee_name, status="ASSIGNED", claimed_at=now, updated_at=now)
+        .returning(*CHANGE_COLUMNS)
+        .execution_options(synchronize_session=False)
+    ).all()
+    apply_orders_rollups(db, order_ids, 1)
+    db.commit()
+    for order in assigned:
+        publish_order_event("order.assigned", order)
+    return order_ids
+
+def assign_pending_orders(db: Session, limit: int = ASSIGN_BATCH_SIZE):
+    """One scheduler pass; returns the number of orders assigned"""
+    release_stale_claims(db)
+    claimed = claim_pending_orders(db, limit)
+    loads = employee_loads(db) if claimed else []
+    if not loads:
+        db.rollback()
+        metrics.record(pending_queue(db).count(), [])
+        return 0
+
+    order_ids = [order.id for order in claimed]
+    plan = plan_assignments(order_ids, loads)
+    now = datetime.utcnow()
+    apply_orders_rollups(db, order_ids, -1)
+    assigned = []
+    for (employee_id, name), ids in plan.items():
+        assigned += db.execute(
+            update(OrderBase)
+            .where(OrderBase.id.in_(ids))
+            .values(employee_id=employee_id, assigned_to=name, status="ASSIGNED", updated_at=now)
+            .returning(*CHANGE_COLUMNS)
+            .execution_options(synchronize_session=False)
+        ).all()
+    apply_orders_rollups(db, order_ids, 1)
+    db.commit()
+
+    for order in assigned:
+        publish_order_event("order.assigned", order)
+    metrics.record(
+        pending_queue(db).count(),
+        [(now - order.created_at).total_seconds() for order in claimed if order.created_at],
+    )
+    return len(order_ids)
+
+def run_scheduler(interval: float = ASSIGN_INTERVAL, stop: threading.Event = None):
+    """Assign continuously while a full batch was claimed, then every interval seconds"""
+    stop = stop or threading.Event()
+    while not stop.is_set():
+        assigned = 0
+        try:
+            with SessionLocal() as db:
+                assigned = assign_pending_orders(db)
+        except Exception:
+            logger.exception("Order assignment pass failed")
+        if assigned < ASSIGN_BATCH_SIZE:
+            stop.wait(interval)
+
+_scheduler_started = False
+_scheduler_lock = threading.Lock()
+
+def start_assignment_scheduler():
+    """Start the scheduler thread once per process when ORDER_AUTO_ASSIGN=1"""
+    global _scheduler_started
+    if not AUTO_ASSIGN:
+        return
+    with _scheduler_lock:
+        if _scheduler_started:
+            return
+        _scheduler_started = True
+    threading.Thread(target=run_scheduler, name="order-assignment", daemon=True).start()
+
+if __name__ == "__main__":
+    import main  # noqa: F401  registers every model and creates missing tables
+
+    logging.basicConfig(level=logging.INFO)
+    run_scheduler()
@@ -0,0 +1,101 @@
+"""Backfill orders.total_amount and orders.item_count from order_items.
+
+Adds any of the newer orders and order_items columns missing from existing
+tables, copies product categories onto order items that have none, then
+recomputes the totals. Finally creates the filter and search indexes and the
+SQLite orders_fts table added since the tables were created. Run from the
+fastapi directory:
+    python -m apis.orders.backfill
+"""
+import logging
+from sqlalchemy import inspect, select, text, update
+import main  # noqa: F401  registers every model and creates missing tables
+from database import SessionLocal, engine
+from fulltext import ensure_sqlite_fts
+from migrations import create_missing_indexes
+from apis.orders_item.models import OrderItem
+from apis.product.models import ProductBase
+from .models import OrderBase
+from .service import recompute_order_totals
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+NEW_COLUMNS = {
+    "updated_at": "TIMESTAMP",
+    "claimed_at": "TIMESTAMP",
+    "total_amount": "FLOAT NOT NULL DEFAULT 0",
+    "item_count": "INTEGER NOT NULL DEFAULT 0",
+}
+NEW_ITEM_COLUMNS = {
+    "category": "VARCHAR",
+    "order_created_at": "TIMESTAMP",
+}
+ITEMS_ORDER_FK = "order_items_order_id_order_created_at_fkey"
+
+def add_missing_columns():
+    for table, columns in (("orders", NEW_COLUMNS), ("order_items", NEW_ITEM_COLUMNS)):
+        existing = {c["name"] for c in inspect(engine).get_columns(table)}
+        with engine.begin() as conn:
+            for name, ddl in columns.items():
+                if name not in existing:
+                    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
+                    logger.info("Added %s.%s", table, name)
+
+def create_search_structures(bind=engine):
+    """Missing orders/order_items indexes (status, employee, id prefix, trigram) and orders_fts"""
+    with bind.begin() as conn:
+        if conn.dialect.name == "postgresql":
+            conn.exec_driver_sql("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for name in ensure_sqlite_fts(conn, OrderBase.__table__):
+            logger.info("Created and filled %s", name)
+        for source_table in (OrderBase.__table__, OrderItem.__table__):
+            for name in create_missing_indexes(conn, source_table):
+                logger.info("Created index %s", name)
+
+def backfill_item_orders(db):
+    """Fill order_items.order_created_at, then add the cascading (order_id, order_created_at) FK"""
+    created_at = select(OrderBase.created_at).where(OrderBase.id == OrderItem.order_id).scalar_subquery()
+    filled = db.execute(
+        update(OrderItem)
+        .where(OrderItem.order_created_at.is_(None))
+        .values(order_created_at=created_at)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    # SQLite cannot add a constraint to an existing table; it gets the FK when the table is recreated
+    if engine.dialect.name == "postgresql":
+        existing = {fk["name"] for fk in inspect(engine).get_foreign_keys("order_items")}
+        if ITEMS_ORDER_FK not in existing:
+            db.execute(text(
+                f"ALTER TABLE order_items ADD CONSTRAINT {ITEMS_ORDER_FK} "
+                "FOREIGN KEY (order_id, order_created_at) REFERENCES orders (id, created_at) ON DELETE CASCADE"
+            ))
+            logger.info("Added %s", ITEMS_ORDER_FK)
+    return filled
+
+def backfill_item_categories(db):
+    """Copy the current product category onto order items saved before it was recorded"""
+    category = select(ProductBase.category).where(ProductBase.id == OrderItem.product_id).scalar_subquery()
+    return db.execute(
+        update(OrderItem)
+        .where(OrderItem.category.is_(None))
+        .values(category=category)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+def backfill_order_totals():
+    add_missing_columns()
+    db = SessionLocal()
+    try:
+        linked = backfill_item_orders(db)
+        categorised = backfill_item_categories(db)
+        updated = recompute_order_totals(db)
+        db.commit()
+        logger.info("Linked %s order items to their order's created_at", linked)
+        logger.info("Set categories on %s order items, recomputed totals for %s orders", categorised, updated)
+    finally:
+        db.close()
+    create_search_structures()
+
+if __name__ == "__main__":
+    backfill_order_totals()
@@ -0,0 +1,139 @@
+import asyncio
+import json
+import logging
+import os
+import select
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from sqlalchemy import text
+from database import engine
+
+# Order change events for the SSE stream in routes.py.
+# Routes call publish_order_event() after their commit. With the default
+# "memory" backend events go straight to this process's broker. With
+# ORDER_EVENTS_BACKEND=postgres they are sent with pg_notify and every worker
+# relays what it hears on the channel into its own broker, so subscribers on
+# any worker see every event. Each broker keeps the last EVENT_BUFFER_SIZE
+# events for Last-Event-ID resumption. Event ids are a per-broker sequence
+# assigned under the broker lock, so they follow dispatch order exactly; an id
+# this broker never issued (another worker, or before a restart) replays the
+# whole buffer.
+
+EVENT_BUFFER_SIZE = 1000
+NOTIFY_CHANNEL = "order_events"
+EVENTS_BACKEND = os.getenv("ORDER_EVENTS_BACKEND", "memory")
+
+logger = logging.getLogger(__name__)
+
+class OrderEventBroker:
+    def __init__(self, buffer_size: int = EVENT_BUFFER_SIZE):
+        self._events = deque(maxlen=buffer_size)
+        self._subscribers = set()  # (loop, asyncio.Queue)
+        self._sequence = 0
+        self._lock = threading.Lock()
+
+    def dispatch(self, event: dict):
+        """Number event, record it and hand it to every subscriber; safe from any thread"""
+        with self._lock:
+            self._sequence += 1
+            event = {**event, "id": self._sequence}
+            self._events.append(event)
+            # Queued under the lock so every subscriber gets events in id order
+            for loop, queue in self._subscribers:
+                try:
+                    loop.call_soon_threadsafe(queue.put_nowait, event)
+                except RuntimeError:
+                    # The subscriber's loop is closed; it unsubscribes on its way out
+                    pass
+        return event
+
+    def replay(self, last_event_id: int):
+        """(buffered events after last_event_id, id of the latest event dispatched)"""
+        with self._lock:
+            if last_event_id > self._sequence:
+                last_event_id = 0
+            return [e for e in self._events if e["id"] > last_event_id], self._sequence
+
+    def subscribe(self):
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue())
+        with self._lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+broker = OrderEventBroker()
+_listener_started = False
+_listener_lock = threading.Lock()
+
+def order_event(event_type: str, order) -> dict:
+    return {
+        "type": event_type,
+        "order_id": order.id,
+        "status": order.status,
+        "employee_id": order.employee_id,
+        "at": datetime.utcnow().isoformat(),
+    }
+
+def publish_order_event(event_type: str, order):
+    """Publish an order change; call after the change is committed"""
+    event = order_event(event_type, order)
+    if EVENTS_BACKEND != "postgres":
+        broker.dispatch(event)
+        return
+    ensure_listener()
+    try:
+        with engine.begin() as conn:
+            conn.execute(text("SELECT pg_notify(:channel, :payload)"),
+                         {"channel": NOTIFY_CHANNEL, "payload": json.dumps(event)})
+    except Exception:
+        # The change itself is committed; a lost event only delays dashboards
+        logger.exception("Could not publish order event %s", event_type)
+
+def ensure_listener():
+    """Start the LISTEN thread once per process when using the postgres backend"""
+    global _listener_started
+    if EVENTS_BACKEND != "postgres":
+        return
+    with _listener_lock:
+        if _listener_started:
+            return
+        _listener_started = True
+    threading.Thread(target=_listen, name="order-events-listener", daemon=True).start()
+
+def _listen():
+    while True:
+        try:
+            conn = engine.raw_connection()
+            try:
+                dbapi_conn = conn.dbapi_connection
+                dbapi_conn.autocommit = True
+                dbapi_conn.cursor().execute(f"LISTEN {NOTIFY_CHANNEL}")
+                while True:
+                    if select.select([dbapi_conn], [], [], 30) == ([], [], []):
+                        continue
+                    dbapi_conn.poll()
+                    while dbapi_conn.notifies:
+                        broker.dispatch(json.loads(dbapi_conn.notifies.pop(0).payload))
+            finally:
+                conn.invalidate()
+        except Exception:
+            logger.exception("Order event listener failed, reconnecting")
+            time.sleep(5)
+
+def can_see(event: dict, current_user: dict, employee_id: str = None) -> bool:
+    """Admins see every event (optionally one employee's); employees see their
+    own orders and unassigned ones, such as new checkouts they can pick up"""
+    if current_user.get("role") == "ADMIN":
+        return not employee_id or event.get("employee_id") == employee_id
+    own_id = current_user.get("id")
+    if not own_id:
+        return False
+    return event.get("employee_id") in (None, own_id)
+
+def format_sse(event: dict) -> str:
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
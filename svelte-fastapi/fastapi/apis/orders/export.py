@@ -0,0 +1,101 @@
+import csv
+import io
+import json
+from datetime import date, datetime, time, timedelta
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from apis.orders_item.models import OrderItem
+from .models import OrderBase
+from .service import apply_order_filters
+
+# Streaming order export for finance.
+# Rows come from one SELECT executed with yield_per, so the driver uses a
+# server-side cursor where it has one and memory stays bounded by
+# EXPORT_FETCH_SIZE rows whatever the export size. Orders are read in
+# (created_at, id) order joined with their items, so all lines of an order
+# arrive together and NDJSON can nest them without buffering more than one order.
+
+EXPORT_FETCH_SIZE = 1000
+EXPORT_CHUNK_ROWS = 500  # rows per chunk handed to the response
+
+ORDER_COLUMNS = (
+    OrderBase.id, OrderBase.customer_name, OrderBase.email, OrderBase.phone,
+    OrderBase.address, OrderBase.status, OrderBase.employee_id, OrderBase.assigned_to,
+    OrderBase.customer_id, OrderBase.total_amount, OrderBase.item_count,
+    OrderBase.created_at, OrderBase.updated_at,
+)
+ITEM_COLUMNS = (
+    OrderItem.id.label("item_id"), OrderItem.product_id.label("item_product_id"),
+    OrderItem.product_name.label("item_product_name"), OrderItem.qty.label("item_qty"),
+    OrderItem.price.label("item_price"),
+)
+ORDER_FIELDS = tuple(c.key for c in ORDER_COLUMNS)
+ITEM_FIELDS = tuple(c.key for c in ITEM_COLUMNS)
+
+def export_statement(db: Session, start: date = None, end: date = None, status: str = "", include_items: bool = False):
+    """SELECT for the export; start and end are inclusive days"""
+    columns = ORDER_COLUMNS + (ITEM_COLUMNS if include_items else ())
+    stmt = select(*columns)
+    if include_items:
+        stmt = stmt.outerjoin(OrderItem, OrderItem.order_id == OrderBase.id)
+    if start:
+        stmt = stmt.where(OrderBase.created_at >= datetime.combine(start, time.min))
+    if end:
+        stmt = stmt.where(OrderBase.created_at < datetime.combine(end + timedelta(days=1), time.min))
+    stmt = apply_order_filters(db, stmt, status=status)
+    order_by = [OrderBase.created_at, OrderBase.id] + ([OrderItem.id] if include_items else [])
+    return stmt.order_by(*order_by).execution_options(yield_per=EXPORT_FETCH_SIZE)
+
+def iter_rows(db: Session, stmt):
+    try:
+        for row in db.execute(stmt).mappings():
+            yield row
+    finally:
+        db.close()
+
+def to_json(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+def iter_csv(rows, include_items: bool):
+    """CSV text in chunks; with items there is one line per order item"""
+    fields = ORDER_FIELDS + (ITEM_FIELDS if include_items else ())
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    count = 0
+    for row in rows:
+        writer.writerow([
+            row[f].isoformat() if isinstance(row[f], datetime) else row[f]
+            for f in fields
+        ])
+        count += 1
+        if count % EXPORT_CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def iter_ndjson(rows, include_items: bool):
+    """One JSON object per order; with items they are nested under "items" """
+    lines, order = [], None
+
+    def flush():
+        lines.append(json.dumps(order, default=to_json) + "\n")
+
+    for row in rows:
+        if order is None or order["id"] != row["id"]:
+            if order is not None:
+                flush()
+                if len(lines) >= EXPORT_CHUNK_ROWS:
+                    yield "".join(lines)
+                    lines.clear()
+            order = {f: row[f] for f in ORDER_FIELDS}
+            if include_items:
+                order["items"] = []
+        if include_items and row["item_id"] is not None:
+            order["items"].append({f.removeprefix("item_"): row[f] for f in ITEM_FIELDS})
+    if order is not None:
+        flush()
+    yield "".join(lines)
@@ -1,12 +1,34 @@
 from datetime import datetime
-from sqlalchemy import Column, DateTime, ForeignKey, Integer, String
+from sqlalchemy import DDL, Column, DateTime, Float, ForeignKey, Index, Integer, PrimaryKeyConstraint, String, event
 from database import Base
+from fulltext import register_sqlite_fts
+from .partitions import register_partitioned, unless_partitioned
 from sqlalchemy.orm import relationship
 
 class OrderBase(Base):
     __tablename__ = 'orders'
+    __table_args__ = (
+        # Postgres partitions by created_at month (see partitions.py) and needs
+        # the partition key in every unique constraint; ids stay unique elsewhere
+        PrimaryKeyConstraint("id", "created_at"),
+        Index("ix_orders_id", "id", unique=True).ddl_if(callable_=unless_partitioned),
+        Index("ix_orders_created_at_id", "created_at", "id"),
+        # Exact filters of service.apply_order_filters, in listing order
+        Index("ix_orders_status_created_at_id", "status", "created_at", "id"),
+        Index("ix_orders_employee_id_created_at_id", "employee_id", "created_at", "id"),
+        # Id prefix search, independent of the database collation
+        Index("ix_orders_id_pattern", "id", postgresql_ops={"id": "text_pattern_ops"}).ddl_if(dialect="postgresql"),
+        # Substring customer_name search; SQLite uses the orders_fts table instead
+        Index(
+            "ix_orders_customer_name_trgm",
+            "customer_name",
+            postgresql_using="gin",
+            postgresql_ops={"customer_name": "gin_trgm_ops"},
+        ).ddl_if(dialect="postgresql"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
     
-    id = Column(String, primary_key=True, index=True)
+    id = Column(String)
     customer_name = Column(String)
     email = Column(String)
     phone = Column(String)
@@ -19,6 +41,23 @@ class OrderBase(Base):
     )
     customer_id = Column(String, ForeignKey("customers.id"), nullable=True)
     assigned_to = Column(String, nullable=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    # Set when an employee claims the order itself; see assignment.claim_orders
+    claimed_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Denormalized from order_items; see service.adjust_order_totals
+    total_amount = Column(Float, default=0, nullable=False)
+    item_count = Column(Integer, default=0, nullable=False)
     employee = relationship("AdminBase", back_populates="orders")
-    items = relationship("OrderItem", back_populates="order")
\ No newline at end of file
+    # The database cascades the delete to order_items; routes also delete them
+    # explicitly for SQLite, which does not enforce foreign keys by default
+    items = relationship("OrderItem", back_populates="order", passive_deletes=True)
+    __mapper_args__ = {"primary_key": [id]}
+
+event.listen(
+    OrderBase.__table__,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"),
+)
+register_sqlite_fts(OrderBase.__table__, "customer_name")
+register_partitioned(OrderBase.__table__)
@@ -0,0 +1,211 @@
+"""Monthly range partitions of orders and order_items on Postgres.
+
+Both tables are declared PARTITION BY RANGE (created_at). Partitions are named
+<table>_pYYYYMM and are created PARTITION_MONTHS_AHEAD months in advance
+when the table is created, on every app start and by the maintenance command
+below (run it daily from cron). A <table>_default partition catches rows
+outside every monthly range. Other dialects keep a plain table.
+
+Old months are archived by detaching their partitions: the rows drop out of
+every ORM query and list endpoint while the detached table stays queryable.
+With --export-dir the rows are also written to <partition>.ndjson.gz, and
+with --drop the detached table is dropped afterwards. Run from the fastapi
+directory:
+    python -m apis.orders.partitions                      # create partitions
+    python -m apis.orders.partitions archive --months 12 --export-dir /backups/orders [--drop]
+    python -m apis.orders.partitions migrate              # convert existing tables
+"""
+import argparse
+import gzip
+import json
+import logging
+import os
+import re
+from datetime import date, datetime
+from decimal import Decimal
+from sqlalchemy import event, text
+
+PARTITIONED_TABLES = ("orders", "order_items")
+PARTITION_MONTHS_AHEAD = 3
+ARCHIVE_AFTER_MONTHS = 12
+EXPORT_FETCH_SIZE = 5000
+
+logger = logging.getLogger(__name__)
+
+def is_partitioned(dialect) -> bool:
+    return dialect.name == "postgresql"
+
+def unless_partitioned(ddl, target, bind, dialect=None, **kw):
+    """ddl_if() callable for constraints and indexes a partitioned table cannot have"""
+    return not is_partitioned(dialect or bind.dialect)
+
+def month_start(value) -> date:
+    return date(value.year, value.month, 1)
+
+def add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+def partition_name(table_name: str, month: date) -> str:
+    return f"{table_name}_p{month:%Y%m}"
+
+def partition_month(table_name: str, name: str):
+    """The month a partition name covers, or None for other tables"""
+    match = re.fullmatch(rf"{re.escape(table_name)}_p(\d{{4}})(\d{{2}})", name)
+    return date(int(match[1]), int(match[2]), 1) if match else None
+
+def is_partitioned_table(conn, table_name: str) -> bool:
+    return conn.execute(
+        text("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:name)"),
+        {"name": table_name},
+    ).first() is not None
+
+def ensure_partitions(conn, table_name: str, first_month: date = None, months_ahead: int = PARTITION_MONTHS_AHEAD):
+    """Create the default partition and one per month up to months_ahead from now"""
+    if not is_partitioned(conn.dialect):
+        return
+    if not is_partitioned_table(conn, table_name):
+        logger.warning("%s is not partitioned yet; run python -m apis.orders.partitions migrate", table_name)
+        return
+    conn.execute(text(f"CREATE TABLE IF NOT EXISTS {table_name}_default PARTITION OF {table_name} DEFAULT"))
+    month = first_month or month_start(datetime.utcnow())
+    last = add_months(month_start(datetime.utcnow()), months_ahead)
+    while month <= last:
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {partition_name(table_name, month)} PARTITION OF {table_name} "
+            f"FOR VALUES FROM ('{month}') TO ('{add_months(month, 1)}')"
+        ))
+        month = add_months(month, 1)
+
+def register_partitioned(source_table):
+    """Create the monthly partitions right after the partitioned table"""
+    def create_partitions(target, connection, **kw):
+        ensure_partitions(connection, target.name)
+    event.listen(source_table, "after_create", create_partitions)
+
+def ensure_all_partitions(engine):
+    if not is_partitioned(engine.dialect):
+        return
+    with engine.begin() as conn:
+        for table_name in PARTITIONED_TABLES:
+            ensure_partitions(conn, table_name)
+
+def attached_partitions(conn, table_name: str):
+    """{month: partition name} of the monthly partitions still attached"""
+    rows = conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = CAST(:parent AS regclass)"
+    ), {"parent": table_name})
+    partitions = {}
+    for (name,) in rows:
+        month = partition_month(table_name, name)
+        if month:
+            partitions[month] = name
+    return partitions
+
+def to_json(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+def export_partition(engine, name: str, export_dir: str) -> str:
+    """Write every row of a partition to <export_dir>/<name>.ndjson.gz"""
+    os.makedirs(export_dir, exist_ok=True)
+    path = os.path.join(export_dir, f"{name}.ndjson.gz")
+    with engine.connect() as conn, gzip.open(path, "wt", encoding="utf-8") as out:
+        result = conn.execution_options(stream_results=True, yield_per=EXPORT_FETCH_SIZE).execute(
+            text(f"SELECT * FROM {name}")
+        )
+        for row in result.mappings():
+            out.write(json.dumps(dict(row), default=to_json) + "\n")
+    return path
+
+def archive_partitions(engine, older_than_months: int = ARCHIVE_AFTER_MONTHS, export_dir: str = None, drop: bool = False):
+    """Detach (then optionally export and drop) monthly partitions older than the cutoff.
+
+    order_items partitions go first, so an order is never archived while its
+    items are still visible. Returns the names of the archived partitions.
+    """
+    if not is_partitioned(engine.dialect):
+        logger.info("Partitioning is only used on Postgres, nothing to archive")
+        return []
+    cutoff = add_months(month_start(datetime.utcnow()), -older_than_months)
+    archived = []
+    for table_name in reversed(PARTITIONED_TABLES):
+        with engine.connect() as conn:
+            partitions = attached_partitions(conn, table_name)
+        for month, name in sorted(partitions.items()):
+            if month >= cutoff:
+                continue
+            with engine.begin() as conn:
+                conn.execute(text(f"ALTER TABLE {table_name} DETACH PARTITION {name}"))
+            logger.info("Detached %s", name)
+            if export_dir:
+                logger.info("Exported %s to %s", name, export_partition(engine, name, export_dir))
+            if drop:
+                with engine.begin() as conn:
+                    conn.execute(text(f"DROP TABLE {name}"))
+                logger.info("Dropped %s", name)
+            archived.append(name)
+    return archived
+
+def migrate_to_partitions(engine, metadata):
+    """Rebuild existing plain orders/order_items tables as partitioned tables.
+
+    The old tables and their indexes are renamed to *_legacy, the partitioned
+    tables are created from the models, the rows are copied over and the
+    legacy tables are dropped, all in one transaction. Run apis.orders.backfill
+    first so the old tables have every current column.
+    """
+    if not is_partitioned(engine.dialect):
+        return
+    with engine.begin() as conn:
+        plain = [
+            name for name in PARTITIONED_TABLES
+            if conn.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar()
+            and not is_partitioned_table(conn, name)
+        ]
+        if not plain:
+            logger.info("orders and order_items are already partitioned")
+            return
+        for name in plain:
+            indexes = conn.execute(text("SELECT indexname FROM pg_indexes WHERE tablename = :name"), {"name": name})
+            for (index,) in indexes.all():
+                conn.execute(text(f"ALTER INDEX {index} RENAME TO {index}_legacy"))
+            conn.execute(text(f"ALTER TABLE {name} RENAME TO {name}_legacy"))
+
+        tables = [metadata.tables[name] for name in plain]
+        metadata.create_all(conn, tables=tables)
+        for source in tables:
+            first = conn.execute(text(f"SELECT min(created_at) FROM {source.name}_legacy")).scalar()
+            if first:
+                ensure_partitions(conn, source.name, first_month=month_start(first))
+            columns = ", ".join(c.name for c in source.columns if c.name != "created_at")
+            conn.execute(text(
+                f"INSERT INTO {source.name} ({columns}, created_at) "
+                f"SELECT {columns}, coalesce(created_at, now()) FROM {source.name}_legacy"
+            ))
+            logger.info("Copied %s into partitions", source.name)
+        for name in reversed(plain):
+            conn.execute(text(f"DROP TABLE {name}_legacy CASCADE"))
+
+if __name__ == "__main__":
+    import main  # noqa: F401  registers every model and creates missing tables
+    from database import Base, engine
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", nargs="?", default="ensure", choices=("ensure", "archive", "migrate"))
+    parser.add_argument("--months", type=int, default=ARCHIVE_AFTER_MONTHS, help="archive partitions older than this")
+    parser.add_argument("--export-dir", help="write archived rows to <partition>.ndjson.gz here")
+    parser.add_argument("--drop", action="store_true", help="drop archived partitions after detaching")
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        migrate_to_partitions(engine, Base.metadata)
+    elif args.command == "archive":
+        archive_partitions(engine, args.months, args.export_dir, args.drop)
+    ensure_all_partitions(engine)
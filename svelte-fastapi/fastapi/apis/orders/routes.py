@@ -1,16 +1,32 @@
-from datetime import datetime
+from datetime import date, datetime
+import asyncio
 import logging
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy import func
 from database import SessionLocal
 from apis.login.models import AdminBase
 from .models import OrderBase
+from apis.orders_item.models import OrderItem
 from role import StatusCode
 from auth import get_current_user, require_admin, require_employee
-from sqlalchemy.orm import Session
-from .schema import AssignOrderRequest, OrderUpdateSchema
-from apis.product.models import ProductBase
-from apis.orders_item.models import OrderItem
+from sqlalchemy.orm import Session, selectinload
+from .schema import AssignOrderRequest, BulkAssignRequest, BulkStatusRequest, OrderUpdateSchema
+from .service import (
+    BULK_MAX_ORDERS,
+    apply_order_filters,
+    bulk_assign_orders,
+    bulk_update_status,
+    restore_order_stock,
+)
+from .assignment import MAX_CLAIM, assign_pending_orders, claim_orders, metrics as assignment_metrics
+from .export import export_statement, iter_csv, iter_ndjson, iter_rows
+from .schema import ExportFormat
+from .events import broker, can_see, ensure_listener, format_sse, publish_order_event
+from apis.reports.service import apply_order_rollups
+from counters import filtered_count, table_count
+from etag import etag_matches, make_etag, not_modified
+from pagination import paginate
 order_router = APIRouter(tags=["Order Route"])
 # Cấu hình logger
 logging.basicConfig(level=logging.INFO)
@@ -35,22 +51,27 @@ def get_list_orders(
     customer_name: str = '',
     employee_id: str = '',
     status: str = '',
-    page: int = 1,
-    limit: int = 10,
+    page: int = Query(1, ge=1),
+    limit: int = Query(10, ge=1, le=100),
+    next_cursor: str | None = None,
 ):
-    order_list = db.query(OrderBase).order_by(OrderBase.created_at.desc())
-    if employee_id: 
-        order_list = order_list.filter(OrderBase.employee_id.contains(employee_id))
-    if search_id:
-        order_list = order_list.filter(OrderBase.id.contains(search_id))
-    if customer_name:
-        order_list = order_list.filter(OrderBase.customer_name.contains(customer_name))
-    if status:
-        order_list = order_list.filter(OrderBase.status.contains(status))
+    order_list = apply_order_filters(
+        db,
+        db.query(OrderBase),
+        search_id=search_id,
+        customer_name=customer_name,
+        employee_id=employee_id,
+        status=status,
+    )
     
-    total_orders = order_list.count() 
-    offset = (page - 1) * limit
-    paginated_orders = order_list.offset(offset).limit(limit).all()
+    filters = (employee_id, search_id, customer_name, status)
+    if any(filters):
+        total_orders = filtered_count(db, order_list, OrderBase, filters)
+    else:
+        total_orders = table_count(db, OrderBase)
+    paginated_orders, next_cursor_value = paginate(
+        order_list, limit, page, next_cursor, date_column=OrderBase.created_at, id_column=OrderBase.id
+    )
     result = []
 
     for order in paginated_orders:
@@ -63,22 +84,171 @@ def get_list_orders(
             "status": order.status,
             "created_at": order.created_at,
             "assign_to": order.assigned_to,
-            "total": sum(i.qty * i.price for i in order.items)
+            "total": order.total_amount
         })
     
     return {
         "search_result": result,
         "orders_count": total_orders,
+        "next_cursor": next_cursor_value,
         "page": page,
         "limit": limit,
         "total_pages": (total_orders + limit - 1) // limit
     }
 
+@order_router.get('/orders/events')
+async def stream_order_events(
+    request: Request,
+    employee_id: str | None = None,
+    last_event_id: int | None = Header(None),
+    current_user: dict = Depends(require_employee),
+):
+    """Server-Sent Events for order changes, resumable with Last-Event-ID"""
+    ensure_listener()
+
+    async def event_stream():
+        subscriber = broker.subscribe()
+        try:
+            events, last_id = broker.replay(last_event_id or 0)
+            for event in events:
+                if can_see(event, current_user, employee_id):
+                    yield format_sse(event)
+            queue = subscriber[1]
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                # Skip events already sent during the replay
+                if event["id"] > last_id and can_see(event, current_user, employee_id):
+                    last_id = event["id"]
+                    yield format_sse(event)
+        finally:
+            broker.unsubscribe(subscriber)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@order_router.get('/orders/export')
+def export_orders(
+    export_format: ExportFormat = Query(ExportFormat.csv, alias="format"),
+    start: date | None = Query(None, description="First day, inclusive"),
+    end: date | None = Query(None, description="Last day, inclusive"),
+    status: str = '',
+    include_items: bool = False,
+    db: Session = Depends(get_db),
+    _: dict = Depends(require_admin),
+):
+    """Stream every matching order as CSV or NDJSON"""
+    if start and end and start > end:
+        raise HTTPException(status_code=StatusCode.HTTP_BAD_REQUEST_400, detail="start must not be after end")
+    stmt = export_statement(db, start, end, status, include_items)
+    rows = iter_rows(db, stmt)
+    if export_format == ExportFormat.csv:
+        body, media_type = iter_csv(rows, include_items), "text/csv"
+    else:
+        body, media_type = iter_ndjson(rows, include_items), "application/x-ndjson"
+    filename = f"orders-{datetime.utcnow():%Y%m%d%H%M%S}.{export_format.value}"
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+def unique_bulk_ids(order_ids):
+    order_ids = list(dict.fromkeys(order_ids))
+    if len(order_ids) > BULK_MAX_ORDERS:
+        raise HTTPException(
+            status_code=StatusCode.HTTP_BAD_REQUEST_400,
+            detail=f"At most {BULK_MAX_ORDERS} orders per request",
+        )
+    return order_ids
+
+@order_router.post('/orders/bulk/assign')
+def bulk_assign(request: BulkAssignRequest, db: Session = Depends(get_db), _: dict = Depends(require_admin)):
+    order_ids = unique_bulk_ids(request.order_ids)
+    employee = db.query(AdminBase.id, AdminBase.employee_name, AdminBase.role).filter(
+        AdminBase.id == request.employee_id
+    ).first()
+    if not employee:
+        raise HTTPException(404, "Employee not found")
+    if employee.role != "EMPLOYEE":
+        raise HTTPException(400, "Only employees can be assigned orders")
+
+    results, changed = bulk_assign_orders(db, order_ids, employee)
+    for order in changed:
+        publish_order_event("order.assigned", order)
+    return {"updated": len(changed), "results": results}
+
+@order_router.post('/orders/bulk/status')
+def bulk_status(request: BulkStatusRequest, db: Session = Depends(get_db), _: dict = Depends(require_employee)):
+    order_ids = unique_bulk_ids(request.order_ids)
+    results, changed = bulk_update_status(db, order_ids, request.status.value)
+    for order in changed:
+        publish_order_event("order.updated", order)
+    return {"updated": len(changed), "results": results}
+
+@order_router.post('/orders/claim')
+def claim_next_orders(
+    n: int = Query(1, ge=1, le=MAX_CLAIM),
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(require_employee),
+):
+    """Take the next n unassigned orders for the calling employee"""
+    employee = db.query(AdminBase.id, AdminBase.employee_name, AdminBase.role).filter(
+        AdminBase.id == current_user.get("id")
+    ).first()
+    if not employee:
+        raise HTTPException(404, "Employee not found")
+    if employee.role != "EMPLOYEE":
+        raise HTTPException(400, "Only employees can claim orders")
+
+    order_ids = claim_orders(db, employee, n)
+    orders = (
+        db.query(OrderBase.id, OrderBase.customer_name, OrderBase.address, OrderBase.total_amount, OrderBase.created_at)
+        .filter(OrderBase.id.in_(order_ids))
+        .order_by(OrderBase.created_at, OrderBase.id)
+        .all()
+    ) if order_ids else []
+    return {"claimed": [dict(o._mapping) for o in orders], "claimed_count": len(orders)}
+
+@order_router.post('/orders/assignment/run')
+def run_order_assignment(db: Session = Depends(get_db), _: dict = Depends(require_admin)):
+    """Run one automatic assignment pass now"""
+    return {"assigned": assign_pending_orders(db)}
+
+@order_router.get('/orders/assignment/metrics')
+def get_assignment_metrics(_: dict = Depends(require_admin)):
+    return assignment_metrics.snapshot()
+
 @order_router.get('/orders/{order_id}')
-def get_order_detail(order_id: str, db: Session = Depends(get_db), _: dict = Depends(require_employee)):
-    order_info = db.query(OrderBase).filter(OrderBase.id == order_id).first()
+def get_order_detail(
+    order_id: str,
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_db),
+    _: dict = Depends(require_employee),
+):
+    version = db.query(OrderBase.updated_at).filter(OrderBase.id == order_id).first()
+    if not version:
+        raise HTTPException(status_code=StatusCode.HTTP_ERROR_404, detail="Order not found")
+    etag = make_etag(order_id, version.updated_at)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    order_info = (
+        db.query(OrderBase)
+        .options(selectinload(OrderBase.items))
+        .filter(OrderBase.id == order_id)
+        .first()
+    )
     if not order_info:
         raise HTTPException(status_code=StatusCode.HTTP_ERROR_404, detail="Order not found")
+    response.headers["ETag"] = make_etag(order_id, order_info.updated_at)
     items = [
         {"product_id": i.product_id, "product_name": i.product_name, "qty": i.qty, "price": i.price}
         for i in order_info.items
@@ -95,26 +265,30 @@ def update_order_info(
     order_info = db.query(OrderBase).filter(OrderBase.id == order_id).first()
     if not order_info:
         raise HTTPException(status_code=404, detail="Order not found")
-    for k, v in order.dict(exclude_unset=True).items():
+    changes = order.dict(exclude_unset=True)
+    was_cancelled = order_info.status == "CANCELLED"
+    if was_cancelled and changes.get("status", "CANCELLED") != "CANCELLED":
+        raise HTTPException(status_code=400, detail="Cancelled orders cannot be reopened")
+
+    apply_order_rollups(db, order_id, -1)
+    if changes.get("status") == "CANCELLED" and not was_cancelled:
+        # Claim the cancellation first so two concurrent cancels cannot both
+        # return the stock, then return it in the same transaction
+        claimed = db.query(OrderBase).filter(
+            OrderBase.id == order_id, OrderBase.status != "CANCELLED"
+        ).update({OrderBase.status: "CANCELLED"}, synchronize_session=False)
+        if not claimed:
+            db.rollback()
+            raise HTTPException(status_code=409, detail="Order was already cancelled")
+        restore_order_stock(db, [order_id])
+    for k, v in changes.items():
         setattr(order_info, k, v)
     order_info.updated_at = datetime.utcnow()
+    apply_order_rollups(db, order_id, 1)
     db.commit()
     db.refresh(order_info)
 
-    if order_info.status == "CANCELLED":
-        order_items = db.query(OrderItem).filter(OrderItem.order_id == order_id).all()
-        for item in order_items:
-            product = db.query(ProductBase).filter(ProductBase.id == item.product_id).first()
-            if product:
-                product.stock += item.qty
-            else:
-                db.rollback()
-                raise HTTPException(
-                    status_code=404,
-                    detail=f"Product '{item.product_name}' not found"
-                )
-        db.commit() 
-
+    publish_order_event("order.updated", order_info)
     return {"message": "Order updated"}
 
 
@@ -123,8 +297,11 @@ def delete_product(order_id: str, db: Session = Depends(get_db), _: dict = Depen
     order_info = db.query(OrderBase).filter(OrderBase.id == order_id).first()
     if not order_info:
         raise HTTPException(status_code=404, detail="Product not found")
+    apply_order_rollups(db, order_id, -1)
+    db.query(OrderItem).filter(OrderItem.order_id == order_id).delete(synchronize_session=False)
     db.delete(order_info)
     db.commit()
+    publish_order_event("order.deleted", order_info)
     return {"message": "Delete order successfully"}
 
 @order_router.post("/orders/{order_id}/assign")
@@ -144,9 +321,13 @@ def assign_order(request: AssignOrderRequest, db: Session = Depends(get_db), _:
     if employee.role != "EMPLOYEE":
         raise HTTPException(400, "Only employees can be assigned orders")
 
+    apply_order_rollups(db, order_id, -1)
     order.employee_id = employee_id
     order.status = 'ASSIGNED'
     order.assigned_to = employee_name
+    order.claimed_at = None
+    apply_order_rollups(db, order_id, 1)
     db.commit()
     db.refresh(order)
+    publish_order_event("order.assigned", order)
     return order
@@ -1,7 +1,7 @@
 from datetime import datetime
 import enum
 from typing import Any, Optional
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 class OrderStatusEnum(str, enum.Enum):
     pending = "PENDING"
@@ -11,6 +11,10 @@ class OrderStatusEnum(str, enum.Enum):
     completed = "COMPLETED"
     cancelled = "CANCELLED"
 
+class ExportFormat(str, enum.Enum):
+    csv = "csv"
+    ndjson = "ndjson"
+
 class OrderSchema(BaseModel):
     id: str
     customer_name: str
@@ -32,4 +36,12 @@ class OrderUpdateSchema(BaseModel):
 
 class AssignOrderRequest(BaseModel):
     employee_id: str
-    order_id: str
\ No newline at end of file
+    order_id: str
+
+class BulkAssignRequest(BaseModel):
+    order_ids: list[str] = Field(min_length=1)
+    employee_id: str
+
+class BulkStatusRequest(BaseModel):
+    order_ids: list[str] = Field(min_length=1)
+    status: OrderStatusEnum
@@ -1,16 +1,161 @@
-import base64
-import json
-
-def encode_cursor(last_item):
-    obj = {
-        "date": last_item.created_at.isoformat() if last_item.created_at else None,
-        "id": last_item.id,
-    }
-    return base64.b64encode(json.dumps(obj).encode("utf-8")).decode("utf-8")
-
-def decode_cursor(next_cursor: str):
-    try:
-        decoded_json = base64.b64decode(next_cursor).decode("utf-8")
-        return json.loads(decoded_json)
-    except Exception:
-        return None
+from datetime import datetime
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+from apis.orders_item.models import OrderItem
+from apis.product.models import ProductBase
+from apis.reports.service import apply_orders_rollups
+from fulltext import fts_matches, tokenize
+from .models import OrderBase
+
+def apply_order_filters(db: Session, query, search_id: str = "", customer_name: str = "", employee_id: str = "", status: str = ""):
+    """Index-backed order filters.
+
+    status and employee_id match exactly, search_id is an id prefix and
+    customer_name is a substring (trigram) match on Postgres or a word prefix
+    (FTS5) match on SQLite.
+    """
+    if employee_id:
+        query = query.filter(OrderBase.employee_id == employee_id)
+    if status:
+        query = query.filter(OrderBase.status == status.upper())
+    search_id = (search_id or "").strip()
+    if search_id:
+        query = query.filter(OrderBase.id.startswith(search_id, autoescape=True))
+    if customer_name:
+        dialect = db.get_bind().dialect.name
+        tokens = tokenize(customer_name)
+        if dialect == "sqlite" and tokens:
+            matches = fts_matches(OrderBase.__table__, "customer_name", tokens)
+            query = query.filter(OrderBase.id.in_(select(matches.c.id)))
+        else:
+            query = query.filter(OrderBase.customer_name.icontains(customer_name, autoescape=True))
+    return query
+
+def adjust_order_totals(db: Session, order_id: str, amount: float = 0, count: int = 0):
+    """Shift the denormalized totals of one order inside the caller's transaction"""
+    db.query(OrderBase).filter(OrderBase.id == order_id).update(
+        {
+            OrderBase.total_amount: OrderBase.total_amount + amount,
+            OrderBase.item_count: OrderBase.item_count + count,
+            OrderBase.updated_at: datetime.utcnow(),
+        },
+        synchronize_session=False,
+    )
+
+def recompute_order_totals(db: Session, order_ids=None):
+    """Rebuild total_amount/item_count from order_items, for all orders or the given ids"""
+    items = OrderItem.__table__
+    amount = (
+        select(func.coalesce(func.sum(items.c.qty * items.c.price), 0))
+        .where(items.c.order_id == OrderBase.id)
+        .scalar_subquery()
+    )
+    count = select(func.count()).where(items.c.order_id == OrderBase.id).scalar_subquery()
+    query = db.query(OrderBase)
+    if order_ids is not None:
+        query = query.filter(OrderBase.id.in_(order_ids))
+    return query.update(
+        {OrderBase.total_amount: amount, OrderBase.item_count: count},
+        synchronize_session=False,
+    )
+
+def restore_order_stock(db: Session, order_ids):
+    """Give the items of the given orders back to stock in one grouped UPDATE"""
+    returned = (
+        select(OrderItem.product_id, func.sum(OrderItem.qty).label("qty"))
+        .where(OrderItem.order_id.in_(order_ids))
+        .group_by(OrderItem.product_id)
+        .subquery()
+    )
+    db.execute(
+        update(ProductBase)
+        .where(ProductBase.id == returned.c.product_id)
+        .values(stock=ProductBase.stock + returned.c.qty)
+        .execution_options(synchronize_session=False)
+    )
+
+# ---------------------------------
+# Bulk operations
+# ---------------------------------
+# Each bulk call is one transaction: the requested orders are locked in id
+# order and checked, then the eligible ones get the rollup retraction, one
+# UPDATE ... RETURNING and the rollup re-application. Orders that cannot be
+# changed are reported per order and left alone. Where rows cannot be locked
+# (SQLite), an order changing between the check and the UPDATE rolls the
+# attempt back and it runs again on fresh rows, up to BULK_ATTEMPTS times.
+
+BULK_MAX_ORDERS = 500
+BULK_ATTEMPTS = 3
+BULK_CONFLICT = "Order changed during the update, please retry"
+
+def lock_bulk_orders(db: Session, order_ids):
+    rows = (
+        db.query(OrderBase.id, OrderBase.status, OrderBase.employee_id)
+        .filter(OrderBase.id.in_(order_ids))
+        .order_by(OrderBase.id)
+        .with_for_update(of=OrderBase)
+        .all()
+    )
+    return {row.id: row for row in rows}
+
+def bulk_result(order_ids, failures: dict):
+    return [
+        {"order_id": order_id, "ok": order_id not in failures, "error": failures.get(order_id)}
+        for order_id in order_ids
+    ]
+
+def apply_bulk_update(db: Session, order_ids, check, values: dict, release_stock: bool = False):
+    """Set values on every order check(order) has no error for.
+
+    Returns (per-order results, updated (id, status, employee_id) rows).
+    """
+    for _ in range(BULK_ATTEMPTS):
+        orders = lock_bulk_orders(db, order_ids)
+        failures = {}
+        for order_id in order_ids:
+            order = orders.get(order_id)
+            error = "Order not found" if order is None else check(order)
+            if error:
+                failures[order_id] = error
+        eligible = [order_id for order_id in order_ids if order_id not in failures]
+        if not eligible:
+            db.rollback()
+            return bulk_result(order_ids, failures), []
+
+        apply_orders_rollups(db, eligible, -1)
+        if release_stock:
+            restore_order_stock(db, eligible)
+        updated = db.execute(
+            update(OrderBase)
+            .where(OrderBase.id.in_(eligible), OrderBase.status != "CANCELLED")
+            .values(**values, updated_at=datetime.utcnow())
+            .returning(OrderBase.id, OrderBase.status, OrderBase.employee_id)
+            .execution_options(synchronize_session=False)
+        ).all()
+        if len(updated) == len(eligible):
+            apply_orders_rollups(db, eligible, 1)
+            db.commit()
+            return bulk_result(order_ids, failures), updated
+        db.rollback()
+
+    failures.update({order_id: BULK_CONFLICT for order_id in eligible})
+    return bulk_result(order_ids, failures), []
+
+def bulk_assign_orders(db: Session, order_ids, employee):
+    """Assign orders to one employee"""
+    def check(order):
+        return "Cancelled orders cannot be assigned" if order.status == "CANCELLED" else None
+
+    return apply_bulk_update(db, order_ids, check, {
+        "employee_id": employee.id,
+        "assigned_to": employee.employee_name,
+        "status": "ASSIGNED",
+        "claimed_at": None,
+    })
+
+def bulk_update_status(db: Session, order_ids, status: str):
+    """Move orders to status, returning cancelled orders' items to stock"""
+    def check(order):
+        return "Order is already cancelled" if order.status == "CANCELLED" else None
+
+    return apply_bulk_update(db, order_ids, check, {"status": status}, release_stock=status == "CANCELLED")
@@ -0,0 +1,75 @@
+import hashlib
+import json
+from datetime import datetime, timedelta
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+from apis.product.cache import ResponseCache
+from .models import CheckoutIdempotencyKey
+from .schema import CheckoutPayload
+
+# Idempotency-Key support for POST /checkout.
+# The key row is written in the same transaction as the order, so a concurrent
+# duplicate fails on the primary key and the order it would create is rolled
+# back. Replays are answered from an in-process TTL cache, then from the table.
+
+IDEMPOTENCY_TTL = timedelta(hours=24)
+IDEMPOTENCY_CACHE_SIZE = 10000
+MAX_KEY_LENGTH = 255
+PURGE_EVERY = 500
+
+response_cache = ResponseCache(IDEMPOTENCY_CACHE_SIZE, int(IDEMPOTENCY_TTL.total_seconds()))
+_stored_since_purge = 0
+
+def validate_key(key: str):
+    if len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail=f"Idempotency-Key must be at most {MAX_KEY_LENGTH} characters")
+
+def request_fingerprint(payload: CheckoutPayload) -> str:
+    return hashlib.sha256(payload.model_dump_json().encode("utf-8")).hexdigest()
+
+def check_fingerprint(stored_hash: str, fingerprint: str):
+    if stored_hash != fingerprint:
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request")
+
+def get_stored_response(db: Session, key: str, fingerprint: str):
+    """Response stored for key, or None. Raises 422 if key was used for another payload."""
+    cached = response_cache.get(key)
+    if cached is not None:
+        check_fingerprint(cached[0], fingerprint)
+        return cached[1]
+
+    record = db.query(CheckoutIdempotencyKey).filter(CheckoutIdempotencyKey.key == key).first()
+    if not record or record.created_at < datetime.utcnow() - IDEMPOTENCY_TTL:
+        return None
+    check_fingerprint(record.request_hash, fingerprint)
+    response = json.loads(record.response)
+    response_cache.set(key, (record.request_hash, response))
+    return response
+
+def remember_response(db: Session, key: str, fingerprint: str, response: dict):
+    """Add the key row to the current transaction; the caller commits"""
+    db.query(CheckoutIdempotencyKey).filter(
+        CheckoutIdempotencyKey.key == key,
+        CheckoutIdempotencyKey.created_at < datetime.utcnow() - IDEMPOTENCY_TTL,
+    ).delete(synchronize_session=False)
+    db.add(CheckoutIdempotencyKey(
+        key=key,
+        request_hash=fingerprint,
+        response=json.dumps(response),
+        created_at=datetime.utcnow(),
+    ))
+
+def cache_response(key: str, fingerprint: str, response: dict):
+    response_cache.set(key, (fingerprint, response))
+
+def purge_expired(db: Session):
+    """Delete expired key rows every PURGE_EVERY stored keys"""
+    global _stored_since_purge
+    _stored_since_purge += 1
+    if _stored_since_purge < PURGE_EVERY:
+        return
+    _stored_since_purge = 0
+    db.query(CheckoutIdempotencyKey).filter(
+        CheckoutIdempotencyKey.created_at < datetime.utcnow() - IDEMPOTENCY_TTL
+    ).delete(synchronize_session=False)
+    db.commit()
@@ -1,16 +1,52 @@
 from datetime import datetime
-from sqlalchemy import Column, DateTime, Float, ForeignKey, Integer, String
+from sqlalchemy import Column, DateTime, Float, ForeignKey, ForeignKeyConstraint, Index, Integer, PrimaryKeyConstraint, String, select
 from database import Base
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 from apis.orders.models import OrderBase
+from apis.orders.partitions import register_partitioned, unless_partitioned
+
+def order_created_at_default(context):
+    """created_at of the item's order, for inserts that leave order_created_at out"""
+    order_id = context.get_current_parameters().get("order_id")
+    orders = OrderBase.__table__
+    return context.connection.execute(select(orders.c.created_at).where(orders.c.id == order_id)).scalar()
 
 class OrderItem(Base):
     __tablename__ = "order_items"
-    id = Column(String, primary_key=True, index=True)
-    order_id = Column(String, ForeignKey("orders.id"))
+    __table_args__ = (
+        # Partitioned like orders. A partitioned orders table is only unique
+        # on (id, created_at), so items reference that pair; deleting an order
+        # deletes its items on every dialect that enforces foreign keys
+        PrimaryKeyConstraint("id", "created_at"),
+        Index("ix_order_items_id", "id", unique=True).ddl_if(callable_=unless_partitioned),
+        ForeignKeyConstraint(
+            ["order_id", "order_created_at"],
+            ["orders.id", "orders.created_at"],
+            ondelete="CASCADE",
+        ),
+        Index("ix_order_items_created_at_id", "created_at", "id"),
+        Index("ix_order_items_order_id_created_at_id", "order_id", "created_at", "id"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+    id = Column(String)
+    order_id = Column(String)
+    order_created_at = Column(DateTime, default=order_created_at_default)
     product_id = Column(String, ForeignKey("products.id"))
     product_name = Column(String)
+    # Category at checkout, so sales reports do not move when a product is recategorised
+    category = Column(String)
     qty = Column(Integer)
     price = Column(Float)
-    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
     order = relationship(OrderBase, back_populates="items")
+    __mapper_args__ = {"primary_key": [id]}
+
+class CheckoutIdempotencyKey(Base):
+    """Stored /checkout response per Idempotency-Key header, so retries replay it"""
+    __tablename__ = "idempotency_keys"
+    key = Column(String(255), primary_key=True)
+    request_hash = Column(String(64), nullable=False)
+    response = Column(String, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+register_partitioned(OrderItem.__table__)
@@ -1,13 +1,18 @@
-import uuid
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from database import SessionLocal
 from .models import OrderItem
 from apis.orders.models import OrderBase
+from apis.orders.service import adjust_order_totals, recompute_order_totals
+from apis.orders.events import publish_order_event
+from apis.reports.service import apply_order_rollups
 from .schema import CheckoutPayload
 from .repository import get_order_items_query
+from .service import place_order
+from .idempotency import cache_response, get_stored_response, purge_expired, remember_response, request_fingerprint, validate_key
 from auth import get_current_user, require_admin
-from apis.product.models import ProductBase
+from pagination import paginate
 order_items_router = APIRouter(tags=['Order Item'])
 
 def get_db():
@@ -23,84 +28,59 @@ def get_account(current_user: dict = Depends(get_current_user)):
 
 
 @order_items_router.post("/checkout")
+def checkout(
+    payload: CheckoutPayload,
+    response: Response,
+    db: Session = Depends(get_db),
+    idempotency_key: str | None = Header(None),
+):
+    if not idempotency_key:
+        order = place_order(db, payload)
+        publish_order_event("order.created", order)
+        return {
+            "message": "Order placed successfully", 
+            "order_id": str(order.id)
+        }
 
-def checkout(payload: CheckoutPayload, db: Session = Depends(get_db)):
-    customer_info = payload.customer
-    cart_info = payload.cart
-    email = customer_info.email
-
-    for key, value in customer_info:
-        if value in [None, "", []]:
-            raise HTTPException(status_code=400, detail=f"Customer field '{key}' is empty")
-
-    order = OrderBase(
-        id=str(uuid.uuid4()), 
-        customer_name=customer_info.name,
-        email=customer_info.email,
-        phone=customer_info.phone,
-        address=customer_info.address,
-        employee_id=None,
-        customer_id=customer_info.customer_id, 
-        status="PENDING"
-    )
-    db.add(order)
-    db.commit()
-    db.refresh(order)
-
-    if not cart_info:
-        raise HTTPException(status_code=400, detail="Cart is empty")
-    
-    if "@" not in email or email.startswith("@") or email.endswith("@"):
-        raise HTTPException(status_code=400, detail="Customer email is invalid")
-
-    for i, item in enumerate(cart_info):
-        for key, value in item:
-            if value in [None, "", []]:
-                raise HTTPException(status_code=400, detail=f"Cart item {i} field '{key}' is empty")
+    validate_key(idempotency_key)
+    fingerprint = request_fingerprint(payload)
+    stored = get_stored_response(db, idempotency_key, fingerprint)
+    if stored is not None:
+        response.headers["Idempotent-Replayed"] = "true"
+        return stored
 
-        order_item = OrderItem(
-            id=str(uuid.uuid4()),
-            order_id=order.id, 
-            product_id=item.product_id,
-            product_name=item.product_name,
-            qty=item.qty,
-            price=item.price
-        )
-        db.add(order_item)
+    result = {}
+    def remember(order):
+        result.update({"message": "Order placed successfully", "order_id": str(order.id)})
+        remember_response(db, idempotency_key, fingerprint, result)
 
-        product = db.query(ProductBase).filter(ProductBase.id == item.product_id).first()
-        if not product:
-            db.rollback()
-            raise HTTPException(
-                status_code=404, 
-                detail=f"Product '{item.get('product_name')}' not found"
-            )
-        elif product.stock >= item.qty:
-            product.stock -= item.qty
-        else:
-            db.rollback()
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Product '{product.product_name}' chỉ còn {product.stock} items"
-            )
-    db.commit()
+    try:
+        order = place_order(db, payload, on_placed=remember)
+    except IntegrityError:
+        # A concurrent request with the same key committed first
+        stored = get_stored_response(db, idempotency_key, fingerprint)
+        if stored is None:
+            raise
+        response.headers["Idempotent-Replayed"] = "true"
+        return stored
 
-    return {
-        "message": "Order placed successfully", 
-        "order_id": str(order.id)
-    }
+    cache_response(idempotency_key, fingerprint, result)
+    publish_order_event("order.created", order)
+    purge_expired(db)
+    return result
 
 @order_items_router.get("/order_items")
 def get_order_items(
-    page: int = 1, 
-    limit: int = 10, 
+    page: int = Query(1, ge=1), 
+    limit: int = Query(10, ge=1, le=100), 
     order_id: str = "", 
     id: str = "", 
+    next_cursor: str | None = None,
     db: Session = Depends(get_db), 
     _: dict = Depends(require_admin)
 ):
     """Lấy danh sách order items với filter và pagination"""
-    order_items = get_order_items_query(db).order_by(OrderItem.created_at.desc())
+    order_items = get_order_items_query(db)
     
     if order_id:
         order_items = order_items.filter(OrderItem.order_id == order_id)
@@ -108,8 +88,9 @@ def get_order_items(
         order_items = order_items.filter(OrderItem.id == id)
     
     total_items = order_items.count() 
-    offset = (page - 1) * limit
-    paginated_items = order_items.offset(offset).limit(limit).all()
+    paginated_items, next_cursor_value = paginate(
+        order_items, limit, page, next_cursor, date_column=OrderItem.created_at, id_column=OrderItem.id
+    )
     
     result = []
     for item in paginated_items:
@@ -126,6 +107,7 @@ def get_order_items(
     return {
         "search_result": result,
         "items_count": total_items,
+        "next_cursor": next_cursor_value,
         "page": page,
         "limit": limit,
         "total_pages": (total_items + limit - 1) // limit
@@ -214,7 +196,10 @@ def delete_order_item(
     # Lưu thông tin trước khi xóa
     order_id = item.order_id
     
+    apply_order_rollups(db, order_id, -1)
     db.delete(item)
+    adjust_order_totals(db, order_id, amount=-(item.qty * item.price), count=-1)
+    apply_order_rollups(db, order_id, 1)
     db.commit()
     
     return {
@@ -249,7 +234,10 @@ def delete_all_items_in_order(
         )
     
     # Xóa tất cả items
+    apply_order_rollups(db, order_id, -1)
     db.query(OrderItem).filter(OrderItem.order_id == order_id).delete()
+    recompute_order_totals(db, [order_id])
+    apply_order_rollups(db, order_id, 1)
     db.commit()
     
     return {
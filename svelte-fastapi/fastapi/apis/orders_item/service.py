@@ -1,16 +1,106 @@
-import base64
-import json
+import uuid
+from datetime import datetime
+from fastapi import HTTPException
+from sqlalchemy import insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from apis.orders.models import OrderBase
+from apis.product.repository import get_products_by_ids
+from apis.product.stock import find_unavailable, merge_quantities, reserve_stock
+from apis.reports.service import apply_order_rollups
+from .models import OrderItem
+from .schema import CheckoutPayload
 
-def encode_cursor(last_item):
-    obj = {
-        "date": last_item.created_at.isoformat() if last_item.created_at else None,
-        "id": last_item.id,
-    }
-    return base64.b64encode(json.dumps(obj).encode("utf-8")).decode("utf-8")
+def validate_checkout(payload: CheckoutPayload):
+    customer_info = payload.customer
+    for key, value in customer_info:
+        if value in [None, "", []]:
+            raise HTTPException(status_code=400, detail=f"Customer field '{key}' is empty")
+
+    if not payload.cart:
+        raise HTTPException(status_code=400, detail="Cart is empty")
+
+    email = customer_info.email
+    if "@" not in email or email.startswith("@") or email.endswith("@"):
+        raise HTTPException(status_code=400, detail="Customer email is invalid")
+
+    for i, item in enumerate(payload.cart):
+        for key, value in item:
+            if value in [None, "", []]:
+                raise HTTPException(status_code=400, detail=f"Cart item {i} field '{key}' is empty")
+        if item.qty <= 0:
+            raise HTTPException(status_code=400, detail=f"Cart item {i} quantity must be positive")
+
+def place_order(db: Session, payload: CheckoutPayload, on_placed=None) -> OrderBase:
+    """Validate, reserve stock and write the order with its items in one transaction.
+
+    on_placed(order) runs inside the transaction, before the stock is
+    reserved, to add rows that must be written atomically with the order.
+    """
+    validate_checkout(payload)
+    customer_info = payload.customer
+    cart_info = payload.cart
+
+    quantities = merge_quantities((item.product_id, item.qty) for item in cart_info)
+    products = get_products_by_ids(db, quantities)
+    missing_id = next((pid for pid in quantities if pid not in products), None)
+    if missing_id:
+        product_name = next(i.product_name for i in cart_info if i.product_id == missing_id)
+        raise HTTPException(status_code=404, detail=f"Product '{product_name}' not found")
 
-def decode_cursor(next_cursor: str):
     try:
-        decoded_json = base64.b64decode(next_cursor).decode("utf-8")
-        return json.loads(decoded_json)
-    except Exception:
-        return None
+        order = OrderBase(
+            id=str(uuid.uuid4()),
+            customer_name=customer_info.name,
+            email=customer_info.email,
+            phone=customer_info.phone,
+            address=customer_info.address,
+            employee_id=None,
+            customer_id=customer_info.customer_id,
+            status="PENDING",
+            total_amount=sum(item.qty * item.price for item in cart_info),
+            item_count=len(cart_info),
+        )
+        db.add(order)
+        db.flush()
+        now = datetime.utcnow()
+        db.execute(insert(OrderItem), [
+            {
+                "id": str(uuid.uuid4()),
+                "order_id": order.id,
+                "order_created_at": order.created_at,
+                "product_id": item.product_id,
+                "product_name": item.product_name,
+                "category": products[item.product_id].category,
+                "qty": item.qty,
+                "price": item.price,
+                "created_at": now,
+            }
+            for item in cart_info
+        ])
+        apply_order_rollups(db, order.id, 1)
+        if on_placed:
+            on_placed(order)
+        db.flush()
+
+        # Reserve last: the product rows stay locked from here to the commit only
+        if not reserve_stock(db, quantities):
+            db.rollback()
+            # Re-read after the rollback to report the current stock
+            products = get_products_by_ids(db, quantities)
+            failed_id = find_unavailable(products, quantities)
+            if failed_id is None:
+                raise HTTPException(status_code=409, detail="Stock changed during checkout, please retry")
+            product = products.get(failed_id)
+            if not product:
+                product_name = next(i.product_name for i in cart_info if i.product_id == failed_id)
+                raise HTTPException(status_code=404, detail=f"Product '{product_name}' not found")
+            raise HTTPException(
+                status_code=400,
+                detail=f"Product '{product.product_name}' chỉ còn {product.stock} items"
+            )
+        db.commit()
+    except SQLAlchemyError:
+        db.rollback()
+        raise
+    return order
@@ -0,0 +1,45 @@
+"""Bring an existing products table up to date.
+
+Creates the indexes and the SQLite FTS table added since the table was
+created (create_all() skips existing tables), then fills NULL
+products.rating and products.created_at left by older rows and makes both
+columns NOT NULL, as they are for new tables: the listing pages on
+(rating, id) and (created_at, id) row values, which skip NULLs. Run once on an
+existing database from the fastapi directory:
+    python -m apis.product.backfill
+"""
+import logging
+from datetime import datetime
+from sqlalchemy import update
+import main  # noqa: F401  registers every model and creates missing tables
+from database import engine
+from fulltext import ensure_sqlite_fts
+from migrations import create_missing_indexes, set_not_null
+from .models import ProductBase
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def create_search_structures(conn):
+    """Missing products indexes (sort keys, id prefix, GIN full-text) and products_fts"""
+    for name in ensure_sqlite_fts(conn, ProductBase.__table__):
+        logger.info("Created and filled %s", name)
+    for name in create_missing_indexes(conn, ProductBase.__table__):
+        logger.info("Created index %s", name)
+
+def backfill_sort_columns(conn):
+    ratings = conn.execute(update(ProductBase).where(ProductBase.rating.is_(None)).values(rating=0)).rowcount
+    created = conn.execute(
+        update(ProductBase).where(ProductBase.created_at.is_(None)).values(created_at=datetime.utcnow())
+    ).rowcount
+    logger.info("Filled %s ratings and %s creation dates", ratings, created)
+    for name in set_not_null(conn, ProductBase.__table__, "rating", "created_at"):
+        logger.info("Made products.%s NOT NULL", name)
+
+def backfill_products(bind=engine):
+    with bind.begin() as conn:
+        create_search_structures(conn)
+        backfill_sort_columns(conn)
+
+if __name__ == "__main__":
+    backfill_products()
@@ -0,0 +1,128 @@
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import event, update
+from sqlalchemy.orm import Session
+from database import Base
+from .models import CatalogVersion, ProductBase
+
+# In-process LRU/TTL cache for the public catalog responses in router_client.
+# Entries hold already-encoded JSON-ready data and are dropped on commit of any
+# session that wrote to products: the detail entry of each changed product and
+# every listing page. The TTL bounds staleness from writes in other workers.
+# Deleting products also bumps catalog_version in the same transaction, which
+# changes the listing ETag in every worker.
+
+CATALOG_CACHE_TTL = 60
+CATALOG_CACHE_SIZE = 1024
+
+class ResponseCache:
+    def __init__(self, maxsize: int, ttl: int):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (value, stored_at)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and time.monotonic() - entry[1] < self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, predicate=None):
+        with self._lock:
+            if predicate is None:
+                self._entries.clear()
+                return
+            for key in [k for k in self._entries if predicate(k)]:
+                del self._entries[key]
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+catalog_cache = ResponseCache(CATALOG_CACHE_SIZE, CATALOG_CACHE_TTL)
+
+def list_key(**params):
+    if params.get("search_product"):
+        params["search_product"] = params["search_product"].strip().lower()
+    return ("list",) + tuple(sorted(params.items()))
+
+def detail_key(product_id: str):
+    return ("detail", product_id)
+
+def invalidate_products(product_ids=None):
+    """Drop listing pages plus the given products' details (all when None)."""
+    if product_ids is None:
+        catalog_cache.invalidate()
+        return
+    ids = set(product_ids)
+    catalog_cache.invalidate(lambda key: key[0] == "list" or key[1] in ids)
+
+# ---------------------------------
+# Write-through invalidation
+# ---------------------------------
+ALL_PRODUCTS = None
+
+def _pending(session: Session):
+    return session.info.setdefault("changed_products", set())
+
+def _bump_deletes(session: Session):
+    session.connection().execute(
+        update(CatalogVersion.__table__)
+        .where(CatalogVersion.id == 1)
+        .values(deletes=CatalogVersion.deletes + 1)
+    )
+
+@event.listens_for(Session, "after_flush")
+def _track_flush(session, flush_context):
+    changed = [
+        obj.id
+        for obj in (*session.new, *session.dirty, *session.deleted)
+        if isinstance(obj, ProductBase)
+    ]
+    if changed:
+        _pending(session).update(changed)
+    if any(isinstance(obj, ProductBase) for obj in session.deleted):
+        _bump_deletes(session)
+
+@event.listens_for(Session, "do_orm_execute")
+def _track_bulk(orm_execute_state):
+    # Bulk UPDATE/DELETE/INSERT statements do not say which rows they touched
+    # unless the caller lists them in the product_ids execution option
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None and mapper.class_ is ProductBase and not orm_execute_state.is_select:
+        product_ids = orm_execute_state.execution_options.get("product_ids")
+        _pending(orm_execute_state.session).update(product_ids or [ALL_PRODUCTS])
+        if orm_execute_state.is_delete:
+            _bump_deletes(orm_execute_state.session)
+
+@event.listens_for(Session, "after_commit")
+def _apply_changes(session):
+    changed = session.info.pop("changed_products", None)
+    if not changed:
+        return
+    invalidate_products(None if ALL_PRODUCTS in changed else changed)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changes(session):
+    session.info.pop("changed_products", None)
+
+@event.listens_for(Base.metadata, "after_drop")
+def _reset_schema(target, connection, **kw):
+    catalog_cache.invalidate()
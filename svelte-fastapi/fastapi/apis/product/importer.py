@@ -0,0 +1,145 @@
+import csv
+import json
+import time
+import uuid
+from datetime import datetime
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from .models import ProductBase
+from .schema import ProductSchema
+
+# Bulk product import from a streamed CSV or NDJSON body.
+# Rows are validated with ProductSchema and written with one multi-row INSERT
+# per batch, each batch in its own transaction. CSV is parsed line by line, so
+# quoted fields must not contain newlines.
+
+IMPORT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+
+CSV_TYPES = ("text/csv", "application/csv")
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+
+def get_import_format(content_type: str):
+    media_type = (content_type or "").split(";")[0].strip().lower()
+    if media_type in CSV_TYPES:
+        return "csv"
+    if media_type in NDJSON_TYPES:
+        return "ndjson"
+    return None
+
+async def iter_lines(stream):
+    buffer = b""
+    async for chunk in stream:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line
+    if buffer:
+        yield buffer
+
+def parse_line(line: str, import_format: str, header: list):
+    if import_format == "ndjson":
+        return json.loads(line)
+    values = next(csv.reader([line]))
+    if len(values) != len(header):
+        raise ValueError(f"expected {len(header)} columns, got {len(values)}")
+    return dict(zip(header, values))
+
+def to_row(product: ProductSchema, now: datetime):
+    return {
+        "id": product.id or str(uuid.uuid4()),
+        "product_name": product.product_name,
+        "category": product.category,
+        "description": product.description,
+        "rating": product.rating,
+        "price": product.price,
+        "stock": product.stock,
+        "created_at": product.created_at or now,
+        "updated_at": product.updated_at or now,
+    }
+
+def insert_batch(db: Session, batch: list):
+    """Insert [(line_number, row)] in one transaction. Returns (inserted, errors)."""
+    try:
+        db.execute(insert(ProductBase), [row for _, row in batch])
+        db.commit()
+        return len(batch), []
+    except IntegrityError:
+        db.rollback()
+
+    # Isolate the offending rows so the rest of the batch still lands
+    inserted, errors = 0, []
+    for line_number, row in batch:
+        try:
+            db.execute(insert(ProductBase), [row])
+            db.commit()
+            inserted += 1
+        except IntegrityError as e:
+            db.rollback()
+            errors.append({"row": line_number, "error": str(e.orig)})
+    return inserted, errors
+
+async def import_products(db: Session, stream, import_format: str):
+    started = time.monotonic()
+    now = datetime.utcnow()
+    header = None
+    batch, errors = [], []
+    rows = inserted = failed = 0
+
+    def report(line_number, error):
+        nonlocal failed
+        failed += 1
+        if len(errors) < MAX_REPORTED_ERRORS:
+            errors.append({"row": line_number, "error": error})
+
+    line_number = 0
+    async for raw in iter_lines(stream):
+        line_number += 1
+        try:
+            line = raw.decode("utf-8-sig" if line_number == 1 else "utf-8").strip()
+        except UnicodeDecodeError as e:
+            rows += 1
+            report(line_number, f"Line is not valid UTF-8: {e.reason} at byte {e.start}")
+            continue
+        if not line:
+            continue
+        if import_format == "csv" and header is None:
+            header = [name.strip() for name in next(csv.reader([line]))]
+            continue
+
+        rows += 1
+        try:
+            product = ProductSchema.model_validate(parse_line(line, import_format, header))
+        except ValidationError as e:
+            report(line_number, e.errors(include_url=False, include_input=False))
+            continue
+        except ValueError as e:
+            report(line_number, str(e))
+            continue
+
+        batch.append((line_number, to_row(product, now)))
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            batch_inserted, batch_errors = await run_in_threadpool(insert_batch, db, batch)
+            inserted += batch_inserted
+            for error in batch_errors:
+                report(error["row"], error["error"])
+            batch = []
+
+    if batch:
+        batch_inserted, batch_errors = await run_in_threadpool(insert_batch, db, batch)
+        inserted += batch_inserted
+        for error in batch_errors:
+            report(error["row"], error["error"])
+
+    elapsed = time.monotonic() - started
+    return {
+        "rows": rows,
+        "inserted": inserted,
+        "failed": failed,
+        "errors": errors,
+        "elapsed_seconds": round(elapsed, 3),
+        "rows_per_second": round(rows / elapsed, 1) if elapsed else None,
+    }
@@ -1,17 +1,52 @@
 from datetime import datetime
-from sqlalchemy import Boolean, Column, DateTime, Float, String, Integer
+from sqlalchemy import DDL, Boolean, Column, DateTime, Float, Index, String, Integer, desc, event, text
 from database import Base
 from sqlalchemy.orm import Mapped, mapped_column
 
 class ProductBase(Base):
     __tablename__ = "products"
+    # Composite indexes matching each keyset sort order in service.SORT_ORDERS,
+    # declared in the direction the listing walks them
+    __table_args__ = (
+        Index("ix_products_created_at_id", desc("created_at"), desc("id")),
+        Index("ix_products_price_id", "price", "id"),
+        Index("ix_products_rating_id", desc("rating"), desc("id")),
+        # Id prefix search (search.apply_id_search) whatever the database collation
+        Index("ix_products_id_pattern", "id", postgresql_ops={"id": "text_pattern_ops"}).ddl_if(dialect="postgresql"),
+        # Full-text index used by search.apply_search; SQLite uses an FTS5 table instead
+        Index(
+            "ix_products_name_tsv",
+            text("to_tsvector('simple', product_name)"),
+            postgresql_using="gin",
+        ).ddl_if(dialect="postgresql"),
+    )
 
     id = Column(String, primary_key=True, index=True)
     product_name = Column(String, nullable=False, index=True)
     category = Column(String, nullable=False, index=True)
     price = Column(Float, nullable=False, index=True)
-    rating = Column(Float)
+    # Sort keys are NOT NULL so keyset pages are plain (value, id) ranges
+    rating = Column(Float, nullable=False, default=0)
     description = Column(String)
     stock= Column(Integer, default=0, nullable=False)
-    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
-    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+    # Bumped on every UPDATE, including bulk ones; used as the ETag version
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+
+class CatalogVersion(Base):
+    """Single row counting product deletes.
+
+    Inserts and updates move max(products.updated_at); a delete leaves no row
+    behind, so cache.py bumps this counter in the deleting transaction and the
+    listing ETag uses both (repository.get_catalog_version).
+    """
+    __tablename__ = "catalog_version"
+
+    id = Column(Integer, primary_key=True)
+    deletes = Column(Integer, nullable=False, default=0)
+
+event.listen(
+    CatalogVersion.__table__,
+    "after_create",
+    DDL("INSERT INTO catalog_version (id, deletes) VALUES (1, 0)"),
+)
@@ -1,8 +1,25 @@
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
-from .models import ProductBase
+from .models import CatalogVersion, ProductBase
 
 def get_products_query(db: Session):
     return db.query(ProductBase)
 
 def get_product_by_id(db: Session, product_id: str):
     return db.query(ProductBase).filter(ProductBase.id == product_id).first()
+
+def get_products_by_ids(db: Session, product_ids):
+    """{id: product} for the given ids in a single IN query; unknown ids are absent"""
+    ids = list(dict.fromkeys(product_ids))
+    if not ids:
+        return {}
+    return {p.id: p for p in db.query(ProductBase).filter(ProductBase.id.in_(ids)).all()}
+
+def get_product_version(db: Session, product_id: str):
+    """(updated_at,) of one product without loading the row, or None"""
+    return db.query(ProductBase.updated_at).filter(ProductBase.id == product_id).first()
+
+def get_catalog_version(db: Session):
+    """(latest product update, product deletes) in one query"""
+    deletes = select(CatalogVersion.deletes).where(CatalogVersion.id == 1).scalar_subquery()
+    return tuple(db.query(func.max(ProductBase.updated_at), deletes).one())
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy.orm import Session
 from .service import get_products_list
 from .repository import get_product_by_id
@@ -8,6 +8,8 @@ from auth import require_admin
 import uuid
 from datetime import datetime
 from .models import ProductBase
+from .cache import catalog_cache
+from .importer import get_import_format, import_products
 from sqlalchemy.exc import SQLAlchemyError, IntegrityError
 from role import StatusCode
 router_admin = APIRouter(prefix="/admin", tags=["Admin Products"])
@@ -40,6 +42,10 @@ def list_products(
         sort_by=sort_by,
     )
 
+@router_admin.get("/products/cache-stats")
+def get_catalog_cache_stats(_: dict = Depends(require_admin)):
+    return catalog_cache.stats()
+
 @router_admin.post("/products", response_model=SuccessMessageSchema)
 def create_product(
     product_info: ProductSchema,
@@ -62,6 +68,21 @@ def create_product(
     db.refresh(new_product)
     return SuccessMessageSchema(message="Product created successfully")
 
+@router_admin.post("/products/import")
+async def bulk_import_products(
+    request: Request,
+    db: Session = Depends(get_db),
+    _: dict = Depends(require_admin),
+):
+    """Import products from a text/csv (with header row) or application/x-ndjson body"""
+    import_format = get_import_format(request.headers.get("content-type"))
+    if not import_format:
+        raise HTTPException(
+            status_code=StatusCode.HTTP_BAD_REQUEST_400,
+            detail="Content-Type must be text/csv or application/x-ndjson",
+        )
+    return await import_products(db, request.stream(), import_format)
+
 @router_admin.put("/products/{product_id}", response_model=SuccessMessageSchema)
 def update_product(product_id: str, product: ProductUpdatePropsSchema, db: Session = Depends(get_db), _: dict = Depends(require_admin)):
     product_obj = get_product_by_id(db, product_id)
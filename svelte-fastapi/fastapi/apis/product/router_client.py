@@ -1,10 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
 from sqlalchemy.orm import Session
 from database import SessionLocal
+from etag import etag_matches, make_etag, not_modified
 from .service import get_products_list
-from .repository import get_product_by_id
+from .repository import get_catalog_version, get_product_by_id, get_product_version, get_products_by_ids
+from .schema import ProductBatchRequest
+from role import StatusCode
+from .cache import catalog_cache, detail_key, list_key
 
 router_client = APIRouter(tags=["Client Products"])
+MAX_BATCH_IDS = 200
 
 def get_db():
     db = SessionLocal()
@@ -15,6 +21,8 @@ def get_db():
 
 @router_client.get("/products")
 def list_products(
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
     search_id: str | None = Query(None),
     search_product: str | None = Query(None),
@@ -23,8 +31,7 @@ def list_products(
     category: str | None = Query("All"),
     sort_by: str | None = Query("featured"),
 ):
-    return get_products_list(
-        db=db,
+    params = dict(
         search_id=search_id,
         search_product=search_product,
         next_cursor=next_cursor,
@@ -32,12 +39,61 @@ def list_products(
         category=category,
         sort_by=sort_by,
     )
+    key = list_key(**params)
+    cached = catalog_cache.get(key)
+    if cached is None:
+        etag = make_etag(key, *get_catalog_version(db))
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        cached = (etag, jsonable_encoder(get_products_list(db=db, **params)))
+        catalog_cache.set(key, cached)
+    etag, result = cached
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+    return result
 
-@router_client.get("/products/{product_id}")
-def get_product_detail(product_id: str, db: Session = Depends(get_db)):
-    product_obj = get_product_by_id(db, product_id)
-    if not product_obj:
-        raise HTTPException(status_code=404, detail="Product not found")
-    return product_obj
+def lookup_products(db: Session, ids: list):
+    # Accept both ids=a&ids=b and ids=a,b
+    ids = list(dict.fromkeys(i.strip() for raw in ids for i in raw.split(",") if i.strip()))
+    if len(ids) > MAX_BATCH_IDS:
+        raise HTTPException(
+            status_code=StatusCode.HTTP_BAD_REQUEST_400,
+            detail=f"At most {MAX_BATCH_IDS} ids per request",
+        )
+    products = get_products_by_ids(db, ids)
+    return {
+        "products": products,
+        "missing": [i for i in ids if i not in products],
+    }
+
+@router_client.get("/products:batch")
+def get_products_batch(ids: list[str] = Query([]), db: Session = Depends(get_db)):
+    return lookup_products(db, ids)
 
+@router_client.post("/products:batch")
+def post_products_batch(payload: ProductBatchRequest, db: Session = Depends(get_db)):
+    return lookup_products(db, payload.ids)
 
+@router_client.get("/products/{product_id}")
+def get_product_detail(product_id: str, request: Request, response: Response, db: Session = Depends(get_db)):
+    key = detail_key(product_id)
+    cached = catalog_cache.get(key)
+    if cached is None:
+        # Check the version alone first so a 304 never loads the product row
+        version = get_product_version(db, product_id)
+        if not version:
+            raise HTTPException(status_code=404, detail="Product not found")
+        etag = make_etag(product_id, version.updated_at)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        product_obj = get_product_by_id(db, product_id)
+        if not product_obj:
+            raise HTTPException(status_code=404, detail="Product not found")
+        cached = (make_etag(product_id, product_obj.updated_at), jsonable_encoder(product_obj))
+        catalog_cache.set(key, cached)
+    etag, result = cached
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+    return result
@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 from pydantic import BaseModel
 
 class ProductSchema(BaseModel):
@@ -13,6 +13,9 @@ class ProductSchema(BaseModel):
     created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
 
+class ProductBatchRequest(BaseModel):
+    ids: List[str]
+
 class SuccessMessageSchema(BaseModel):
     message: str
 
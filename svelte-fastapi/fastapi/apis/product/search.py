@@ -0,0 +1,40 @@
+from sqlalchemy import Float, cast, func, literal_column
+from sqlalchemy.orm import Session
+from fulltext import fts_matches, register_sqlite_fts, tokenize
+from .models import ProductBase
+
+# Full-text search over product_name.
+# - Postgres: GIN index ix_products_name_tsv (see models.py), ranked by ts_rank.
+# - SQLite: FTS5 shadow table products_fts (see fulltext.py), ranked by bm25.
+# Other dialects fall back to the old LIKE scan without ranking.
+# Ranks are normalised so that a smaller value is always a better match.
+
+TS_CONFIG = literal_column("'simple'")
+
+register_sqlite_fts(ProductBase.__table__, "product_name")
+
+def apply_search(db: Session, query, term: str):
+    """Filter query by term. Returns (query, rank) where rank is None if unranked."""
+    tokens = tokenize(term)
+    if not tokens:
+        return query, None
+
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        ts_query = func.to_tsquery(TS_CONFIG, " & ".join(f"{t}:*" for t in tokens))
+        ts_vector = func.to_tsvector(TS_CONFIG, ProductBase.product_name)
+        rank = -cast(func.ts_rank(ts_vector, ts_query), Float)
+        return query.filter(ts_vector.op("@@")(ts_query)), rank
+
+    if dialect == "sqlite":
+        matches = fts_matches(ProductBase.__table__, "product_name", tokens)
+        return query.join(matches, matches.c.id == ProductBase.id), matches.c.rank
+
+    return query.filter(func.lower(ProductBase.product_name).like(f"%{term.lower()}%")), None
+
+def apply_id_search(query, search_id: str):
+    # Escaped LIKE prefix; on Postgres it uses the text_pattern_ops index in models.py
+    search_id = search_id.strip()
+    if not search_id:
+        return query
+    return query.filter(ProductBase.id.startswith(search_id, autoescape=True))
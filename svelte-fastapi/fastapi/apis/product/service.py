@@ -1,22 +1,100 @@
 import base64
+import binascii
 import json
-from sqlalchemy import func
+from datetime import datetime
+from fastapi import HTTPException
+from sqlalchemy import tuple_
 from sqlalchemy.orm import Session
+from counters import table_count
+from role import StatusCode
 from .models import ProductBase
 from .repository import get_products_query
-def encode_cursor(last_item):
+from .search import apply_id_search, apply_search
+
+# sort_by -> (sort column, descending). Every order is tie-broken on id so the
+# (value, id) pair is unique and can be used as a keyset cursor.
+SORT_ORDERS = {
+    "price-asc": ("price", False),
+    "price-desc": ("price", True),
+    "rating": ("rating", True),
+    "featured": ("created_at", True),
+    # Only available while searching; "rank" is the search score, lower is better
+    "relevance": ("rank", False),
+}
+DEFAULT_SORT = "featured"
+
+def resolve_sort(sort_by: str, ranked: bool = False):
+    # A text search with the default order is shown best match first
+    if ranked and sort_by in (None, DEFAULT_SORT, "relevance"):
+        return "relevance"
+    if sort_by not in SORT_ORDERS or sort_by == "relevance":
+        return DEFAULT_SORT
+    return sort_by
+
+def get_sort_order(sort_by: str):
+    if sort_by not in SORT_ORDERS:
+        sort_by = DEFAULT_SORT
+    return sort_by, SORT_ORDERS[sort_by]
+
+def get_sort_column(field: str, rank=None):
+    return rank if field == "rank" else getattr(ProductBase, field)
+
+def encode_cursor(last_item, sort_by: str = DEFAULT_SORT, rank: float = None):
+    sort_by, (field, _) = get_sort_order(sort_by)
+    value = rank if field == "rank" else getattr(last_item, field)
     obj = {
-        "date": last_item.created_at.isoformat() if last_item.created_at else None,
+        "sort": sort_by,
+        "value": value.isoformat() if isinstance(value, datetime) else value,
         "id": last_item.id,
     }
     return base64.b64encode(json.dumps(obj).encode("utf-8")).decode("utf-8")
 
+def invalid_cursor():
+    return HTTPException(status_code=StatusCode.HTTP_BAD_REQUEST_400, detail="Invalid cursor")
+
 def decode_cursor(next_cursor: str):
+    """{"sort", "value", "id"} from a next_cursor, with value parsed for its sort.
+
+    400 when it was not issued by encode_cursor: value must be a number, or an
+    ISO datetime for created_at, so it always binds as the sort column's type.
+    """
     try:
-        decoded_json = base64.b64decode(next_cursor).decode("utf-8")
-        return json.loads(decoded_json)
-    except Exception:
-        return None
+        decoded = json.loads(base64.b64decode(next_cursor, validate=True).decode("utf-8"))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise invalid_cursor()
+    if not isinstance(decoded, dict) or decoded.get("sort") not in SORT_ORDERS or not isinstance(decoded.get("id"), str):
+        raise invalid_cursor()
+
+    field, _ = SORT_ORDERS[decoded["sort"]]
+    value = decoded.get("value")
+    if field == "created_at":
+        try:
+            value = datetime.fromisoformat(value)
+        except (TypeError, ValueError):
+            raise invalid_cursor()
+    elif isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise invalid_cursor()
+    return {"sort": decoded["sort"], "value": value, "id": decoded["id"]}
+
+def apply_sort(query, sort_by: str, rank=None):
+    _, (field, descending) = get_sort_order(sort_by)
+    column = get_sort_column(field, rank)
+    # Sort columns are NOT NULL, so (column, id) walks the matching index in models.py
+    if descending:
+        return query.order_by(column.desc(), ProductBase.id.desc())
+    return query.order_by(column.asc(), ProductBase.id.asc())
+
+def apply_cursor(query, sort_by: str, decoded_cursor: dict, rank=None):
+    """Keep only rows strictly after the cursor in the given sort order."""
+    sort_by, (field, descending) = get_sort_order(sort_by)
+    # A cursor issued for another sort order points somewhere meaningless
+    if decoded_cursor["sort"] != sort_by:
+        return query
+
+    # A row-value comparison is a single range on the (column, id) index
+    key = tuple_(get_sort_column(field, rank), ProductBase.id)
+    last = tuple_(decoded_cursor["value"], decoded_cursor["id"])
+    return query.filter(key < last if descending else key > last)
 
 def get_products_list(
     db: Session,
@@ -25,42 +103,35 @@ def get_products_list(
     next_cursor: str = None,
     limit: int = 10,
     category: str = None,
-    sort_by: str = None,  # 'price-asc', 'price-desc', 'rating', 'featured'
+    sort_by: str = None,  # 'price-asc', 'price-desc', 'rating', 'featured', 'relevance'
 ):
     query = get_products_query(db)
 
     # search
+    rank = None
     if search_id:
-        query = query.filter(ProductBase.id.like(f"%{search_id}%"))
+        query = apply_id_search(query, search_id)
     if search_product:
-        query = query.filter(func.lower(ProductBase.product_name).like(f"%{search_product.lower()}%"))
+        query, rank = apply_search(db, query, search_product)
     if category and category != "All":
         query = query.filter(ProductBase.category == category)
+    sort_by = resolve_sort(sort_by, ranked=rank is not None)
 
     # cursor
-    decoded_cursor = decode_cursor(next_cursor)
-    if decoded_cursor:
-        last_date = decoded_cursor.get("date")
-        last_id = decoded_cursor.get("id")
-        if last_date and last_id:
-            query = query.filter(
-                (ProductBase.created_at < last_date)
-                | ((ProductBase.created_at == last_date) & (ProductBase.id < last_id))
-            )
+    if next_cursor:
+        query = apply_cursor(query, sort_by, decode_cursor(next_cursor), rank)
 
     # sort
-    if sort_by == "price-asc":
-        query = query.order_by(ProductBase.price.asc())
-    elif sort_by == "price-desc":
-        query = query.order_by(ProductBase.price.desc())
-    elif sort_by == "rating":
-        query = query.order_by(ProductBase.rating.desc())
-    else:
-        query = query.order_by(ProductBase.created_at.desc(), ProductBase.id.desc())
+    query = apply_sort(query, sort_by, rank)
 
-    items = query.limit(limit).all()
-    next_cursor_value = encode_cursor(items[-1]) if items else None
-    total_count = db.query(ProductBase).count()
+    if rank is not None:
+        rows = query.add_columns(rank).limit(limit).all()
+        items = [row[0] for row in rows]
+        next_cursor_value = encode_cursor(rows[-1][0], sort_by, rows[-1][1]) if rows else None
+    else:
+        items = query.limit(limit).all()
+        next_cursor_value = encode_cursor(items[-1], sort_by) if items else None
+    total_count = table_count(db, ProductBase)
 
     return {
         "search_result": items,
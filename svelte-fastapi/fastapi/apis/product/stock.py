@@ -0,0 +1,45 @@
+from sqlalchemy import case, update
+from sqlalchemy.orm import Session
+from .models import ProductBase
+
+# Stock reservation with a conditional UPDATE: the check and the decrement are
+# a single statement, so concurrent checkouts cannot oversell, no product is
+# loaded into Python and no row is locked ahead of the write. The UPDATE's own
+# row locks last until the caller commits, so callers reserve as the last
+# statement of the transaction (see orders_item.service.place_order) and hot
+# products stay locked only for the UPDATE and the COMMIT. Nothing is
+# committed here; the caller owns the transaction and must roll back when a
+# reservation fails.
+
+def merge_quantities(lines):
+    """[(product_id, qty)] -> {product_id: total qty}, in a stable id order"""
+    totals = {}
+    for product_id, qty in lines:
+        totals[product_id] = totals.get(product_id, 0) + qty
+    return dict(sorted(totals.items()))
+
+def reserve_stock(db: Session, quantities: dict) -> bool:
+    """Decrement stock for {product_id: qty} in one UPDATE, if every product has enough.
+
+    Returns False if any product is missing or short; some rows may then have
+    been decremented, so the caller must roll back.
+    """
+    if not quantities:
+        return True
+    product_ids = sorted(quantities)
+    qty = case(quantities, value=ProductBase.id)
+    result = db.execute(
+        update(ProductBase)
+        .where(ProductBase.id.in_(product_ids), ProductBase.stock >= qty)
+        .values(stock=ProductBase.stock - qty)
+        .execution_options(synchronize_session=False, product_ids=product_ids)
+    )
+    return result.rowcount == len(quantities)
+
+def find_unavailable(products: dict, quantities: dict):
+    """First product id in quantities that is missing from products or short on stock"""
+    for product_id, qty in quantities.items():
+        product = products.get(product_id)
+        if product is None or product.stock < qty:
+            return product_id
+    return None
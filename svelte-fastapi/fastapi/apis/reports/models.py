@@ -0,0 +1,29 @@
+from sqlalchemy import Column, Date, Float, Integer, String
+from database import Base
+
+class SalesDailyRollup(Base):
+    """Per-day sales totals for one dimension value (a product, category, employee or status)"""
+    __tablename__ = "sales_daily_rollups"
+
+    dimension = Column(String, primary_key=True)
+    day = Column(Date, primary_key=True)
+    key = Column(String, primary_key=True)
+    orders = Column(Integer, default=0, nullable=False)
+    units = Column(Integer, default=0, nullable=False)
+    revenue = Column(Float, default=0, nullable=False)
+
+class SalesRollupDelta(Base):
+    """A pending change to one rollup row, written by the order's own transaction.
+
+    Appending deltas takes no lock on the shared rollup rows; service.fold_rollup_deltas
+    adds them onto sales_daily_rollups later and deletes them.
+    """
+    __tablename__ = "sales_rollup_deltas"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    dimension = Column(String, nullable=False)
+    day = Column(Date, nullable=False)
+    key = Column(String, nullable=False)
+    orders = Column(Integer, default=0, nullable=False)
+    units = Column(Integer, default=0, nullable=False)
+    revenue = Column(Float, default=0, nullable=False)
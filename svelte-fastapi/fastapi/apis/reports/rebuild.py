@@ -0,0 +1,24 @@
+"""Rebuild the daily sales rollups from orders and order_items.
+
+Use after a bulk load or to repair drift. Run from the fastapi directory:
+    python -m apis.reports.rebuild
+"""
+import logging
+import main  # noqa: F401  registers every model and creates missing tables
+from database import SessionLocal
+from .models import SalesDailyRollup
+from .service import rebuild_sales_rollups
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def rebuild():
+    db = SessionLocal()
+    try:
+        rebuild_sales_rollups(db)
+        logger.info("Rebuilt %s rollup rows", db.query(SalesDailyRollup).count())
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    rebuild()
@@ -0,0 +1,53 @@
+from datetime import date, timedelta
+from enum import Enum
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from auth import require_admin
+from database import SessionLocal
+from role import StatusCode
+from .service import query_sales, rebuild_sales_rollups
+
+reports_router = APIRouter(tags=["Reports"])
+
+class ReportDimension(str, Enum):
+    product = "product"
+    category = "category"
+    employee = "employee"
+    status = "status"
+
+def get_db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+@reports_router.get("/reports/sales")
+def get_sales_report(
+    dimension: ReportDimension = Query(ReportDimension.product),
+    start: date | None = Query(None, description="First day, defaults to 30 days ago"),
+    end: date | None = Query(None, description="Last day, defaults to today"),
+    key: str | None = Query(None, description="Only this product/category/employee/status"),
+    by_day: bool = Query(False, description="One row per day and key"),
+    db: Session = Depends(get_db),
+    _: dict = Depends(require_admin),
+):
+    end = end or date.today()
+    start = start or end - timedelta(days=30)
+    if start > end:
+        raise HTTPException(status_code=StatusCode.HTTP_BAD_REQUEST_400, detail="start must not be after end")
+
+    rows = query_sales(db, dimension.value, start, end, key=key, by_day=by_day)
+    return {
+        "dimension": dimension.value,
+        "start": start,
+        "end": end,
+        "rows": rows,
+        "total_revenue": sum(r["revenue"] for r in rows),
+        "total_units": sum(r["units"] for r in rows),
+    }
+
+@reports_router.post("/reports/sales/rebuild")
+def rebuild_sales_report(db: Session = Depends(get_db), _: dict = Depends(require_admin)):
+    rebuild_sales_rollups(db)
+    return {"message": "Sales rollups rebuilt"}
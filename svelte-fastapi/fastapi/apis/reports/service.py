@@ -0,0 +1,222 @@
+from datetime import date
+from sqlalchemy import delete, func, insert, literal, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from apis.orders.models import OrderBase
+from apis.orders_item.models import OrderItem
+from .models import SalesDailyRollup, SalesRollupDelta
+
+# Daily sales rollups, maintained incrementally.
+# Every write that changes an order's contribution wraps the change in
+#     apply_order_rollups(db, order_id, -1)   # before
+#     apply_order_rollups(db, order_id, +1)   # after
+# inside the same transaction. That only appends rows to sales_rollup_deltas,
+# so checkouts never wait on each other for a shared rollup row.
+# fold_rollup_deltas() later adds the deltas onto sales_daily_rollups in key
+# order and deletes them; it runs before every report query and, with
+# SALES_ROLLUP_FOLD=1, from a background thread (see worker.py).
+# The status dimension counts every order; product, category and employee
+# only count orders that are not CANCELLED. Categories come from the order
+# item, captured at checkout. rebuild_sales_rollups() recomputes everything
+# from orders/order_items.
+
+DIMENSIONS = ("product", "category", "employee", "status")
+EXCLUDED_STATUS = "CANCELLED"
+UNASSIGNED = "unassigned"
+UNKNOWN_CATEGORY = "unknown"
+DEFAULT_STATUS = "PENDING"
+FOLD_BATCH_SIZE = 5000
+
+def order_contributions(db: Session, order_ids):
+    """{(dimension, day, key): [orders, units, revenue]} summed over the given orders"""
+    orders = db.query(OrderBase.id, OrderBase.created_at, OrderBase.status, OrderBase.employee_id).filter(
+        OrderBase.id.in_(order_ids), OrderBase.created_at.isnot(None)
+    ).all()
+    if not orders:
+        return {}
+
+    items_by_order = {}
+    items = (
+        db.query(OrderItem.order_id, OrderItem.product_id, OrderItem.qty, OrderItem.price, OrderItem.category)
+        .filter(OrderItem.order_id.in_([o.id for o in orders]))
+        .all()
+    )
+    for item in items:
+        items_by_order.setdefault(item.order_id, []).append(item)
+
+    rows = {}
+    def add(dimension, day, key, orders, units, revenue):
+        entry = rows.setdefault((dimension, day, key), [0, 0, 0.0])
+        entry[0] += orders
+        entry[1] += units
+        entry[2] += revenue
+
+    for order in orders:
+        day = order.created_at.date()
+        order_items = items_by_order.get(order.id, [])
+        units = sum(i.qty or 0 for i in order_items)
+        revenue = sum((i.qty or 0) * (i.price or 0) for i in order_items)
+        status = order.status or DEFAULT_STATUS
+        add("status", day, status, 1, units, revenue)
+        if status == EXCLUDED_STATUS:
+            continue
+        add("employee", day, order.employee_id or UNASSIGNED, 1, units, revenue)
+        # An order counts once per product/category however many lines it has
+        seen = set()
+        for item in order_items:
+            qty, amount = item.qty or 0, (item.qty or 0) * (item.price or 0)
+            for dimension, key in (("product", item.product_id), ("category", item.category or UNKNOWN_CATEGORY)):
+                add(dimension, day, key, 0 if (dimension, key) in seen else 1, qty, amount)
+                seen.add((dimension, key))
+    return rows
+
+def upsert_rollups(db: Session, deltas: list):
+    """Add [{dimension, day, key, orders, units, revenue}] deltas onto the rollup rows.
+
+    Rows are written in key order so two concurrent folds lock them in the same order.
+    """
+    if not deltas:
+        return
+    deltas = sorted(deltas, key=lambda d: (d["dimension"], d["day"], d["key"]))
+    table = SalesDailyRollup.__table__
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        dialect_insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        stmt = dialect_insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.dimension, table.c.day, table.c.key],
+            set_={
+                "orders": table.c.orders + stmt.excluded.orders,
+                "units": table.c.units + stmt.excluded.units,
+                "revenue": table.c.revenue + stmt.excluded.revenue,
+            },
+        )
+        db.execute(stmt, deltas)
+        return
+
+    for values in deltas:
+        updated = db.execute(
+            table.update()
+            .where(table.c.dimension == values["dimension"], table.c.day == values["day"], table.c.key == values["key"])
+            .values(
+                orders=table.c.orders + values["orders"],
+                units=table.c.units + values["units"],
+                revenue=table.c.revenue + values["revenue"],
+            )
+        )
+        if updated.rowcount == 0:
+            db.execute(table.insert().values(**values))
+
+def apply_orders_rollups(db: Session, order_ids, sign: int):
+    """Queue the addition (sign=1) or retraction (sign=-1) of several orders' current contribution"""
+    if not order_ids:
+        return
+    db.flush()
+    deltas = [
+        dict(dimension=dimension, day=day, key=key, orders=sign * orders, units=sign * units, revenue=sign * revenue)
+        for (dimension, day, key), (orders, units, revenue) in order_contributions(db, order_ids).items()
+    ]
+    if deltas:
+        db.execute(insert(SalesRollupDelta), deltas)
+
+def apply_order_rollups(db: Session, order_id: str, sign: int):
+    """Queue the addition (sign=1) or retraction (sign=-1) of an order's current contribution"""
+    apply_orders_rollups(db, [order_id], sign)
+
+def fold_rollup_deltas(db: Session, limit: int = FOLD_BATCH_SIZE) -> int:
+    """Move up to limit pending deltas into sales_daily_rollups and commit; returns how many.
+
+    Deltas locked by another fold are skipped, so folds can run side by side.
+    """
+    d = SalesRollupDelta
+    pending = (
+        db.query(d.id, d.dimension, d.day, d.key, d.orders, d.units, d.revenue)
+        .order_by(d.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+    if not pending:
+        db.rollback()
+        return 0
+    totals = {}
+    for row in pending:
+        entry = totals.setdefault((row.dimension, row.day, row.key), [0, 0, 0.0])
+        entry[0] += row.orders
+        entry[1] += row.units
+        entry[2] += row.revenue
+    upsert_rollups(db, [
+        dict(dimension=dimension, day=day, key=key, orders=orders, units=units, revenue=revenue)
+        for (dimension, day, key), (orders, units, revenue) in totals.items()
+    ])
+    db.execute(delete(d).where(d.id.in_([row.id for row in pending])))
+    db.commit()
+    return len(pending)
+
+def fold_all_rollup_deltas(db: Session) -> int:
+    folded = total = fold_rollup_deltas(db)
+    while folded == FOLD_BATCH_SIZE:
+        folded = fold_rollup_deltas(db)
+        total += folded
+    return total
+
+def rebuild_sales_rollups(db: Session):
+    """Replace every rollup row with totals recomputed from the raw tables"""
+    o, i = OrderBase.__table__, OrderItem.__table__
+    day = func.date(o.c.created_at)
+    units = func.coalesce(func.sum(i.c.qty), 0)
+    revenue = func.coalesce(func.sum(i.c.qty * i.c.price), 0)
+    orders = func.count(func.distinct(o.c.id))
+    status = func.coalesce(o.c.status, DEFAULT_STATUS)
+    dated = o.c.created_at.isnot(None)
+    counted = status != EXCLUDED_STATUS
+
+    status_key = status
+    employee_key = func.coalesce(o.c.employee_id, UNASSIGNED)
+    category_key = func.coalesce(i.c.category, UNKNOWN_CATEGORY)
+    selects = [
+        select(literal("status"), day, status_key, orders, units, revenue)
+        .select_from(o.outerjoin(i, i.c.order_id == o.c.id))
+        .where(dated).group_by(day, status_key),
+        select(literal("employee"), day, employee_key, orders, units, revenue)
+        .select_from(o.outerjoin(i, i.c.order_id == o.c.id))
+        .where(dated, counted).group_by(day, employee_key),
+        select(literal("product"), day, i.c.product_id, orders, units, revenue)
+        .select_from(o.join(i, i.c.order_id == o.c.id))
+        .where(dated, counted, i.c.product_id.isnot(None)).group_by(day, i.c.product_id),
+        select(literal("category"), day, category_key, orders, units, revenue)
+        .select_from(o.join(i, i.c.order_id == o.c.id))
+        .where(dated, counted).group_by(day, category_key),
+    ]
+
+    table = SalesDailyRollup.__table__
+    columns = [table.c.dimension, table.c.day, table.c.key, table.c.orders, table.c.units, table.c.revenue]
+    # Pending deltas are already part of the recomputed totals
+    db.execute(delete(SalesRollupDelta))
+    db.execute(delete(table))
+    for stmt in selects:
+        db.execute(insert(table).from_select(columns, stmt))
+    db.commit()
+
+def query_sales(db: Session, dimension: str, start: date, end: date, key: str = None, by_day: bool = False):
+    """Summed rollups for one dimension over [start, end], by key (and day)"""
+    fold_all_rollup_deltas(db)
+    r = SalesDailyRollup
+    group = [r.key] if not by_day else [r.day, r.key]
+    query = (
+        db.query(*group, func.sum(r.orders), func.sum(r.units), func.sum(r.revenue))
+        .filter(r.dimension == dimension, r.day >= start, r.day <= end)
+        .group_by(*group)
+        .having(func.sum(r.orders) != 0)  # keys whose orders were all retracted
+    )
+    if key:
+        query = query.filter(r.key == key)
+    query = query.order_by(r.day, func.sum(r.revenue).desc()) if by_day else query.order_by(func.sum(r.revenue).desc())
+
+    rows = []
+    for row in query.all():
+        entry = {"key": row.key, "orders": row[-3], "units": row[-2], "revenue": row[-1]}
+        if by_day:
+            entry["day"] = row.day
+        rows.append(entry)
+    return rows
@@ -0,0 +1,52 @@
+"""Background folding of pending sales rollup deltas.
+
+Checkouts and order updates only append to sales_rollup_deltas (see
+service.py). This loop moves them into sales_daily_rollups every
+SALES_ROLLUP_FOLD_INTERVAL seconds, or continuously while a full batch was
+pending. Reports fold whatever is left before they query, so the loop only
+keeps the delta table short. It runs when SALES_ROLLUP_FOLD=1 and can also
+be run on its own from the fastapi directory:
+    python -m apis.reports.worker
+"""
+import logging
+import os
+import threading
+from database import SessionLocal
+from .service import FOLD_BATCH_SIZE, fold_rollup_deltas
+
+FOLD_ENABLED = os.getenv("SALES_ROLLUP_FOLD") == "1"
+FOLD_INTERVAL = float(os.getenv("SALES_ROLLUP_FOLD_INTERVAL", "10"))
+
+logger = logging.getLogger(__name__)
+
+def run_folder(interval: float = FOLD_INTERVAL, stop: threading.Event = None):
+    stop = stop or threading.Event()
+    while not stop.is_set():
+        folded = 0
+        try:
+            with SessionLocal() as db:
+                folded = fold_rollup_deltas(db)
+        except Exception:
+            logger.exception("Sales rollup fold failed")
+        if folded < FOLD_BATCH_SIZE:
+            stop.wait(interval)
+
+_folder_started = False
+_folder_lock = threading.Lock()
+
+def start_rollup_folder():
+    """Start the fold thread once per process when SALES_ROLLUP_FOLD=1"""
+    global _folder_started
+    if not FOLD_ENABLED:
+        return
+    with _folder_lock:
+        if _folder_started:
+            return
+        _folder_started = True
+    threading.Thread(target=run_folder, name="sales-rollup-fold", daemon=True).start()
+
+if __name__ == "__main__":
+    import main  # noqa: F401  registers every model and creates missing tables
+
+    logging.basicConfig(level=logging.INFO)
+    run_folder()
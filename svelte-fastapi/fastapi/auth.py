@@ -1,6 +1,10 @@
+from collections import OrderedDict
 from datetime import datetime, timedelta, timezone
+import hashlib
+import threading
+import time
 from jose import JWTError, jwt, ExpiredSignatureError
-from fastapi import Depends, HTTPException
+from fastapi import Depends, HTTPException, Request
 from fastapi.security import OAuth2PasswordBearer
 import os
 from dotenv import load_dotenv
@@ -19,6 +23,7 @@ SECRET_KEY = os.getenv("JWT_SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM")
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 REFRESH_TOKEN_EXPIRE_DAYS = 7
+VERIFIED_TOKEN_CACHE_SIZE = 10000
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 # Create JWT token
@@ -29,35 +34,89 @@ def create_token(data: dict, expires_delta: timedelta):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-# Verify JWT token and extract payload
-def verify_token(token: str):
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        exp = payload.get("exp")
-        if payload.get("token_type") != "access":
-            raise HTTPException(status_code=401, detail="Invalid token type")
-        if exp is None:
-            raise HTTPException(status_code=StatusCode.HTTP_UNAUTHORIZE_401.value, detail="Token missing expiration")
+# Verified claims, keyed by a digest of the token and kept until the token's
+# exp, so a token's signature is checked once per process instead of on
+# every request. Only successfully decoded tokens are stored.
+class VerifiedTokenCache:
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()  # digest -> (claims, exp)
+        self._lock = threading.Lock()
+
+    def get(self, digest: bytes):
+        with self._lock:
+            entry = self._entries.get(digest)
+            if not entry:
+                return None
+            if entry[1] <= time.time():
+                del self._entries[digest]
+                return None
+            self._entries.move_to_end(digest)
+            return dict(entry[0])
 
-        if datetime.now(timezone.utc).timestamp() > exp:
-            raise HTTPException(status_code=StatusCode.HTTP_UNAUTHORIZE_401.value, detail="Token expired")
+    def set(self, digest: bytes, claims: dict):
+        exp = claims.get("exp")
+        if not isinstance(exp, (int, float)):
+            return
+        with self._lock:
+            self._entries[digest] = (dict(claims), exp)
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
 
-        if "sub" not in payload:
-            raise HTTPException(status_code=StatusCode.HTTP_UNAUTHORIZE_401.value, detail="Invalid token payload")
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
 
-        return payload
+verified_tokens = VerifiedTokenCache(VERIFIED_TOKEN_CACHE_SIZE)
 
+def decode_token(token: str) -> dict:
+    """jwt.decode with signature and exp checks, served from verified_tokens when possible"""
+    digest = hashlib.sha256(token.encode("utf-8")).digest()
+    claims = verified_tokens.get(digest)
+    if claims is None:
+        claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        verified_tokens.set(digest, claims)
+    return claims
+
+# Check the claims of a decoded token are a usable access token
+def check_claims(payload: dict):
+    exp = payload.get("exp")
+    if payload.get("token_type") != "access":
+        raise HTTPException(status_code=401, detail="Invalid token type")
+    if exp is None:
+        raise HTTPException(status_code=StatusCode.HTTP_UNAUTHORIZE_401.value, detail="Token missing expiration")
+
+    if datetime.now(timezone.utc).timestamp() > exp:
+        raise HTTPException(status_code=StatusCode.HTTP_UNAUTHORIZE_401.value, detail="Token expired")
+
+    if "sub" not in payload:
+        raise HTTPException(status_code=StatusCode.HTTP_UNAUTHORIZE_401.value, detail="Invalid token payload")
+
+    return payload
+
+# Verify JWT token and extract payload
+def verify_token(token: str):
+    try:
+        return check_claims(decode_token(token))
     except ExpiredSignatureError:
         raise HTTPException(status_code=StatusCode.HTTP_UNAUTHORIZE_401.value, detail="Token expired")
     except JWTError:
         raise HTTPException(status_code=StatusCode.HTTP_UNAUTHORIZE_401.value, detail="Invalid token")
     
 
-def get_current_user(token: str = Depends(oauth2_scheme)):
-    user_info = verify_token(token)
+def get_current_user(request: Request, token: str = Depends(oauth2_scheme)):
+    # AuthMiddleware may already have decoded this token for the request
+    verified = getattr(request.state, "verified_token", None)
+    if verified and verified[0] == token:
+        user_info = check_claims(verified[1])
+    else:
+        user_info = verify_token(token)
+        request.state.verified_token = (token, user_info)
     return {
         "user_email": user_info.get("sub"),
-        "role": user_info.get("role")
+        "role": user_info.get("role"),
+        "id": user_info.get("id")
     }
 
 def handle_login_role(employee_info: any):
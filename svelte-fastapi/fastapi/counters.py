@@ -0,0 +1,122 @@
+import threading
+import time
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+from database import Base
+
+# Row counters for listing endpoints, so total_* fields stop costing a full
+# count() per page.
+# - table_count: per-table totals, loaded once then kept up to date from ORM
+#   inserts/deletes on commit. Resynced every TABLE_COUNT_TTL seconds to pick
+#   up writes made by other worker processes.
+# - filtered_count: counts for a filtered query, cached for FILTER_COUNT_TTL
+#   seconds and dropped as soon as the table is written to in this process.
+# Counters are per process and keyed by database URL and table name.
+
+TABLE_COUNT_TTL = 300
+FILTER_COUNT_TTL = 5
+
+_lock = threading.Lock()
+_table_counts = {}   # (url, table) -> [count, loaded_at]
+_filter_counts = {}  # (url, table, key) -> (count, loaded_at)
+
+def _url(bind):
+    return str(bind.url)
+
+def table_count(db: Session, model, estimate: bool = False) -> int:
+    """Total rows of model's table.
+
+    estimate=True reads the planner's estimate (pg_class.reltuples) on Postgres,
+    which is free but may be off by a few percent; elsewhere it is ignored.
+    """
+    bind = db.get_bind()
+    table = model.__table__.name
+    if estimate and bind.dialect.name == "postgresql":
+        rows = db.execute(
+            text("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:table)"),
+            {"table": table},
+        ).scalar()
+        # reltuples is -1 until the table has been analyzed
+        if rows is not None and rows >= 0:
+            return rows
+
+    key = (_url(bind), table)
+    with _lock:
+        cached = _table_counts.get(key)
+        if cached and time.monotonic() - cached[1] < TABLE_COUNT_TTL:
+            return cached[0]
+
+    count = db.query(model).count()
+    with _lock:
+        _table_counts[key] = [count, time.monotonic()]
+    return count
+
+def filtered_count(db: Session, query, model, key, ttl: int = FILTER_COUNT_TTL) -> int:
+    """query.count(), cached under key for ttl seconds."""
+    cache_key = (_url(db.get_bind()), model.__table__.name, key)
+    with _lock:
+        cached = _filter_counts.get(cache_key)
+        if cached and time.monotonic() - cached[1] < ttl:
+            return cached[0]
+
+    count = query.count()
+    with _lock:
+        _filter_counts[cache_key] = (count, time.monotonic())
+    return count
+
+def invalidate(url: str = None, table: str = None):
+    """Forget cached counts, optionally only for one database and/or table."""
+    with _lock:
+        for cache in (_table_counts, _filter_counts):
+            for key in list(cache):
+                if (url is None or key[0] == url) and (table is None or key[1] == table):
+                    del cache[key]
+
+# ---------------------------------
+# Keep counts in sync with ORM writes
+# ---------------------------------
+def _pending(session: Session):
+    return session.info.setdefault("row_count_changes", ({}, set()))
+
+@event.listens_for(Session, "after_flush")
+def _track_flush(session, flush_context):
+    deltas, _ = _pending(session)
+    for objects, step in ((session.new, 1), (session.deleted, -1)):
+        for obj in objects:
+            table = getattr(obj, "__tablename__", None)
+            if table:
+                deltas[table] = deltas.get(table, 0) + step
+
+@event.listens_for(Session, "do_orm_execute")
+def _track_bulk(orm_execute_state):
+    # Bulk insert()/delete() statements do not go through the unit of work,
+    # so the row delta is unknown and the counter is reloaded instead.
+    if (orm_execute_state.is_insert or orm_execute_state.is_delete) and orm_execute_state.bind_mapper:
+        _, stale = _pending(orm_execute_state.session)
+        stale.add(orm_execute_state.bind_mapper.local_table.name)
+
+@event.listens_for(Session, "after_commit")
+def _apply_changes(session):
+    deltas, stale = session.info.pop("row_count_changes", ({}, set()))
+    if not deltas and not stale:
+        return
+    url = _url(session.get_bind())
+    with _lock:
+        for table, delta in deltas.items():
+            cached = _table_counts.get((url, table))
+            if cached:
+                cached[0] += delta
+        for key in list(_filter_counts):
+            if key[0] == url and (key[1] in deltas or key[1] in stale):
+                del _filter_counts[key]
+        for table in stale:
+            _table_counts.pop((url, table), None)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changes(session):
+    session.info.pop("row_count_changes", None)
+
+@event.listens_for(Base.metadata, "after_create")
+@event.listens_for(Base.metadata, "after_drop")
+def _reset_schema(target, connection, **kw):
+    invalidate(url=_url(connection.engine))
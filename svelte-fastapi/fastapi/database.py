@@ -1,6 +1,6 @@
 import os
-from sqlalchemy import create_engine
-from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session, declarative_base, raiseload, sessionmaker
 
 TESTING = os.getenv("TESTING") == "TESTING_ENVIRONMENT"
 
@@ -16,3 +16,15 @@ engine = create_engine(
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
+
+# Development/test guard against N+1 queries: every ORM SELECT gets
+# raiseload("*"), so touching a relationship the endpoint did not eager-load
+# with selectinload()/joinedload() raises instead of lazily querying per row.
+RAISELOAD = TESTING or os.getenv("ORM_RAISELOAD") == "1"
+
+def raise_on_lazy_load(orm_execute_state):
+    if orm_execute_state.is_select and not orm_execute_state.is_relationship_load:
+        orm_execute_state.statement = orm_execute_state.statement.options(raiseload("*"))
+
+if RAISELOAD:
+    event.listen(Session, "do_orm_execute", raise_on_lazy_load)
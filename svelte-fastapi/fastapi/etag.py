@@ -0,0 +1,21 @@
+import hashlib
+from datetime import datetime
+from fastapi import Request, Response
+
+# Strong ETags for conditional GET. Callers build the tag from cheap version
+# data (an updated_at column, a row count, the query parameters) so that an
+# If-None-Match hit can answer 304 without loading the full rows.
+
+def make_etag(*parts) -> str:
+    raw = "|".join(p.isoformat() if isinstance(p, datetime) else str(p) for p in parts)
+    return '"' + hashlib.sha1(raw.encode("utf-8")).hexdigest() + '"'
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [tag.strip() for tag in header.split(",")]
+    return "*" in candidates or etag in candidates
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag})
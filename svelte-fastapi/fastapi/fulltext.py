@@ -0,0 +1,88 @@
+import re
+from sqlalchemy import DDL, column, event, func, inspect, literal_column, select, table
+
+# SQLite FTS5 shadow tables for text search on a single column.
+# register_sqlite_fts() creates "<table>_fts" next to the source table, keeps
+# it in sync with triggers (its rowid mirrors the source rowid) and drops it
+# with the table. Tables created before their FTS table was registered get it
+# from ensure_sqlite_fts(), run on app start and by the backfill commands.
+# fts_matches() returns an (id, rank) subquery to join on, where a smaller
+# rank is a better match.
+
+# {source table name: (source table, indexed column)}
+SQLITE_FTS = {}
+
+def tokenize(term: str):
+    return re.findall(r"\w+", term.lower())
+
+def fts_table_name(source_table):
+    return f"{source_table.name}_fts"
+
+def fts_statements(source_table, column_name: str):
+    """(create, triggers, fill) statements of the FTS table of source_table"""
+    name = fts_table_name(source_table)
+    source = source_table.name
+    create = f"CREATE VIRTUAL TABLE IF NOT EXISTS {name} USING fts5(id UNINDEXED, {column_name})"
+    triggers = [
+        f"""CREATE TRIGGER IF NOT EXISTS {name}_ai AFTER INSERT ON {source} BEGIN
+            INSERT INTO {name}(rowid, id, {column_name}) VALUES (new.rowid, new.id, new.{column_name});
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {name}_ad AFTER DELETE ON {source} BEGIN
+            DELETE FROM {name} WHERE rowid = old.rowid;
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {name}_au AFTER UPDATE OF id, {column_name} ON {source} BEGIN
+            UPDATE {name} SET id = new.id, {column_name} = new.{column_name} WHERE rowid = old.rowid;
+        END""",
+    ]
+    fill = f"INSERT INTO {name}(rowid, id, {column_name}) SELECT rowid, id, {column_name} FROM {source}"
+    return create, triggers, fill
+
+def register_sqlite_fts(source_table, column_name: str):
+    SQLITE_FTS[source_table.name] = (source_table, column_name)
+    create, triggers, fill = fts_statements(source_table, column_name)
+    for statement in [create, *triggers, fill]:
+        event.listen(source_table, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+    event.listen(
+        source_table,
+        "before_drop",
+        DDL(f"DROP TABLE IF EXISTS {fts_table_name(source_table)}").execute_if(dialect="sqlite"),
+    )
+
+def ensure_sqlite_fts(conn, *source_tables):
+    """Create, fill and attach the FTS tables missing next to existing source tables.
+
+    create_all() skips tables that already exist, so their after_create hooks
+    never ran. Covers every registered table unless source_tables are given.
+    Returns the names of the FTS tables created.
+    """
+    if conn.dialect.name != "sqlite":
+        return []
+    inspector = inspect(conn)
+    created = []
+    names = [t.name for t in source_tables] or list(SQLITE_FTS)
+    for source_name in names:
+        source_table, column_name = SQLITE_FTS[source_name]
+        if not inspector.has_table(source_name):
+            continue
+        create, triggers, fill = fts_statements(source_table, column_name)
+        missing = not inspector.has_table(fts_table_name(source_table))
+        if missing:
+            conn.exec_driver_sql(create)
+        for trigger in triggers:
+            conn.exec_driver_sql(trigger)
+        # Filled only when new: the triggers keep an existing table in sync
+        if missing:
+            conn.exec_driver_sql(fill)
+            created.append(fts_table_name(source_table))
+    return created
+
+def fts_matches(source_table, column_name: str, tokens):
+    """(id, rank) subquery of rows whose column matches every token as a prefix"""
+    name = fts_table_name(source_table)
+    fts = table(name, column("id"), column(column_name))
+    match = " ".join(f'"{t}"*' for t in tokens)
+    return (
+        select(fts.c.id, func.bm25(literal_column(name)).label("rank"))
+        .where(literal_column(name).op("MATCH")(match))
+        .subquery()
+    )
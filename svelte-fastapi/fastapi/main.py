@@ -1,3 +1,4 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from apis.employee.routes import router as employee_router
 from apis.login.routes import router as register_router
@@ -8,10 +9,22 @@ from apis.orders_item.routes import order_items_router as order_items_router
 from apis.customer.routes import router as customer_router
 from apis.forget_password.routes_employee import employee_router as forget_password_router_employee
 from apis.forget_password.routes_customer import customer_router as forget_password_router_customer
+from apis.reports.routes import reports_router
+from apis.orders.partitions import ensure_all_partitions
+from apis.orders.assignment import start_assignment_scheduler
+from apis.reports.worker import start_rollup_folder
 from database import Base, engine
+from fulltext import ensure_sqlite_fts
+from security.security import password_pool
 from fastapi.middleware.cors import CORSMiddleware
 
-app = FastAPI(title="Company API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Stop the Argon2 worker processes with the app
+    password_pool.shutdown()
+
+app = FastAPI(title="Company API", lifespan=lifespan)
 origins = ['http://localhost:5173', 'https://python-learn-d3pj.vercel.app']
     
 app.add_middleware(CORSMiddleware, allow_origins=origins, allow_credentials=True, allow_methods=['*'], allow_headers=['*'])
@@ -25,5 +38,11 @@ app.include_router(order_router)
 app.include_router(order_items_router)
 app.include_router(forget_password_router_employee)
 app.include_router(forget_password_router_customer)
+app.include_router(reports_router)
 
-Base.metadata.create_all(bind=engine)
\ No newline at end of file
+Base.metadata.create_all(bind=engine)
+ensure_all_partitions(engine)
+with engine.begin() as conn:
+    ensure_sqlite_fts(conn)
+start_assignment_scheduler()
+start_rollup_folder()
@@ -1,26 +1,55 @@
-import os
-from fastapi import Request
 from fastapi.responses import JSONResponse
-from starlette.middleware.base import BaseHTTPMiddleware
-from jose import JWTError, jwt
+from jose import ExpiredSignatureError, JWTError
+from auth import decode_token
 from role import StatusCode
 
-class AuthMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        public_paths = ["/login", "/signup", "/docs", "/openapi.json"]
-        if request.url.path in public_paths:
-            return await call_next(request)
+PUBLIC_PATHS = frozenset({"/login", "/signup", "/docs", "/openapi.json"})
+PUBLIC_PREFIXES = ("/docs/",)
 
-        auth_header = request.headers.get("Authorization")
+class AuthMiddleware:
+    """Rejects HTTP requests without a valid bearer token, outside the public paths.
+
+    A plain ASGI middleware, so responses (including streams) pass through
+    untouched. The decoded claims are stored in scope["state"] as
+    verified_token = (token, claims), which auth.get_current_user reuses
+    instead of decoding the token again.
+    """
+
+    def __init__(self, app, public_paths=PUBLIC_PATHS, public_prefixes=PUBLIC_PREFIXES):
+        self.app = app
+        self.public_paths = frozenset(public_paths)
+        self.public_prefixes = tuple(public_prefixes)
+
+    def is_public(self, path: str) -> bool:
+        return path in self.public_paths or path.startswith(self.public_prefixes)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.is_public(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        auth_header = None
+        for name, value in scope["headers"]:
+            if name == b"authorization":
+                auth_header = value.decode("latin-1")
+                break
         if not auth_header:
-            return JSONResponse(status_code=StatusCode.HTTP_UNAUTHORIZE_401.value, content={"message": "Missing Authorization header"})
+            await self.reject("Missing Authorization header", scope, receive, send)
+            return
 
         token = auth_header.replace("Bearer ", "")
         try:
-            jwt.decode(token, os.getenv("JWT_SECRET_KEY"), algorithms=[os.getenv("ALGORITHM")])
-        except jwt.ExpiredSignatureError:
-            return JSONResponse(status_code=StatusCode.HTTP_UNAUTHORIZE_401.value, content={"message": "Token expired"})
+            claims = decode_token(token)
+        except ExpiredSignatureError:
+            await self.reject("Token expired", scope, receive, send)
+            return
         except JWTError:
-            return JSONResponse(status_code=StatusCode.HTTP_UNAUTHORIZE_401.value, content={"message": "Invalid token"})
+            await self.reject("Invalid token", scope, receive, send)
+            return
+
+        scope.setdefault("state", {})["verified_token"] = (token, claims)
+        await self.app(scope, receive, send)
 
-        return await call_next(request)
+    async def reject(self, message: str, scope, receive, send):
+        response = JSONResponse(status_code=StatusCode.HTTP_UNAUTHORIZE_401.value, content={"message": message})
+        await response(scope, receive, send)
@@ -0,0 +1,39 @@
+from sqlalchemy import inspect
+
+# Helpers for the backfill commands that bring tables created by an older
+# version of the models up to date. create_all() only creates missing tables,
+# so indexes and NOT NULL constraints added to an existing table since then
+# have to be applied here. Every step checks first and can be re-run.
+#
+# On Postgres CREATE INDEX blocks writes to the table while it builds; run the
+# backfills in a quiet period on large tables.
+
+def create_missing_indexes(conn, source_table):
+    """Create the declared indexes source_table does not have yet; returns their names.
+
+    Indexes whose ddl_if() excludes the dialect (Postgres-only GIN indexes on
+    SQLite, for example) are skipped.
+    """
+    existing = {index["name"] for index in inspect(conn).get_indexes(source_table.name)}
+    created = []
+    for index in sorted(source_table.indexes, key=lambda index: index.name):
+        if index.name in existing:
+            continue
+        index.create(conn, checkfirst=True)
+        if conn.dialect.has_index(conn, source_table.name, index.name):
+            created.append(index.name)
+    return created
+
+def set_not_null(conn, source_table, *column_names):
+    """ALTER the columns to NOT NULL where the existing table still allows NULL.
+
+    SQLite cannot change a column's nullability in place; the constraint is
+    applied when the table is recreated. Returns the columns altered.
+    """
+    if conn.dialect.name != "postgresql":
+        return []
+    nullable = {c["name"] for c in inspect(conn).get_columns(source_table.name) if c["nullable"]}
+    altered = [name for name in column_names if name in nullable]
+    for name in altered:
+        conn.exec_driver_sql(f"ALTER TABLE {source_table.name} ALTER COLUMN {name} SET NOT NULL")
+    return altered
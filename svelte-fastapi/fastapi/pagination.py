@@ -0,0 +1,54 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from fastapi import HTTPException
+from sqlalchemy import tuple_
+from role import StatusCode
+
+# Newest-first paging shared by the order and order item listings.
+# Rows are ordered by (date column desc, id desc). A next_cursor holds the
+# last row's pair, and the next page is the single row-value range below it
+# on the matching composite index. Page numbers still work for old clients,
+# but only down to MAX_PAGE_OFFSET rows.
+
+MAX_PAGE_OFFSET = 1000
+
+def encode_cursor(last_item, date_column, id_column):
+    value = getattr(last_item, date_column.key)
+    obj = {
+        "date": value.isoformat() if value else None,
+        "id": getattr(last_item, id_column.key),
+    }
+    return base64.b64encode(json.dumps(obj).encode("utf-8")).decode("utf-8")
+
+def decode_cursor(next_cursor: str):
+    """(date, id) from a next_cursor; 400 when it was not issued by encode_cursor"""
+    try:
+        decoded = json.loads(base64.b64decode(next_cursor, validate=True).decode("utf-8"))
+        return datetime.fromisoformat(decoded["date"]), str(decoded["id"])
+    except (binascii.Error, UnicodeDecodeError, ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=StatusCode.HTTP_BAD_REQUEST_400, detail="Invalid cursor")
+
+def apply_cursor(query, next_cursor: str, date_column, id_column):
+    """Rows after the cursor in (date desc, id desc) order"""
+    last_date, last_id = decode_cursor(next_cursor)
+    return query.filter(tuple_(date_column, id_column) < tuple_(last_date, last_id))
+
+def paginate(query, limit: int, page: int = 1, next_cursor: str = None, *, date_column, id_column):
+    """(items, next_cursor) for one page, by cursor when given, else by capped offset"""
+    query = query.order_by(date_column.desc(), id_column.desc())
+    if next_cursor:
+        query = apply_cursor(query, next_cursor, date_column, id_column)
+    else:
+        offset = (page - 1) * limit
+        if offset > MAX_PAGE_OFFSET:
+            raise HTTPException(
+                status_code=StatusCode.HTTP_BAD_REQUEST_400,
+                detail="Page is too deep, use next_cursor instead",
+            )
+        query = query.offset(offset)
+    items = query.limit(limit + 1).all()
+    if len(items) > limit:
+        return items[:limit], encode_cursor(items[limit - 1], date_column, id_column)
+    return items, None
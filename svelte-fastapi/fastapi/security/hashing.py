@@ -0,0 +1,11 @@
+from passlib.context import CryptContext
+
+# Runs inside the password hash worker processes, so it imports nothing but
+# passlib: the workers start from a fresh interpreter.
+pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
+
+def hash_password(password: str) -> str:
+    return pwd_context.hash(password)
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(plain_password, hashed_password)
@@ -1,12 +1,143 @@
-from passlib.context import CryptContext
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from fastapi import HTTPException
+from . import hashing
 
-pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
+# Argon2 runs in a dedicated process pool so a burst of logins cannot eat the
+# API's CPU. At most PASSWORD_HASH_WORKERS hashes run at once and at most
+# PASSWORD_HASH_QUEUE_LIMIT more wait; beyond that callers get a 503 right
+# away. Request handlers await the *_async functions, so a waiting hash holds
+# no threadpool thread; the plain functions block the calling thread and are
+# meant for scripts and tests. A worker that dies breaks the executor, which
+# is then replaced for the next call. PASSWORD_HASH_WORKERS=0 hashes inline.
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_QUEUE_LIMIT = int(os.getenv("PASSWORD_HASH_QUEUE_LIMIT", str(max(1, PASSWORD_HASH_WORKERS) * 16)))
+PASSWORD_HASH_TIMEOUT = 30
+
+def unavailable(detail: str) -> HTTPException:
+    return HTTPException(status_code=503, detail=detail, headers={"Retry-After": "1"})
+
+class PasswordHashPool:
+    def __init__(self, workers: int, queue_limit: int):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.in_flight = 0
+        self.peak_queue_depth = 0
+        self.completed = 0
+        self.rejected = 0
+        self.restarts = 0
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # spawn: forking a process that already runs threads can deadlock the child
+                self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+            return self._executor
+
+    def _discard(self, executor):
+        """Drop a broken executor so the next call starts a fresh one"""
+        with self._lock:
+            if self._executor is not executor:
+                return
+            self._executor = None
+            self.restarts += 1
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _done(self, executor, future):
+        with self._lock:
+            self.in_flight -= 1
+            self.completed += 1
+        if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+            self._discard(executor)
+
+    def _submit(self, fn, *args):
+        with self._lock:
+            if self.in_flight >= self.workers + self.queue_limit:
+                self.rejected += 1
+                raise unavailable("Too many password checks in progress, please retry")
+            self.in_flight += 1
+            self.peak_queue_depth = max(self.peak_queue_depth, self.in_flight - self.workers)
+        try:
+            try:
+                executor = self._get_executor()
+                future = executor.submit(fn, *args)
+            except BrokenProcessPool:
+                self._discard(executor)
+                executor = self._get_executor()
+                future = executor.submit(fn, *args)
+        except Exception:
+            with self._lock:
+                self.in_flight -= 1
+            raise
+        future.add_done_callback(partial(self._done, executor))
+        return future
+
+    def run(self, fn, *args):
+        """fn(*args) in a worker process, blocking the calling thread"""
+        if self.workers <= 0:
+            return fn(*args)
+        future = self._submit(fn, *args)
+        try:
+            return future.result(timeout=PASSWORD_HASH_TIMEOUT)
+        except FutureTimeoutError:
+            future.cancel()
+            raise unavailable("Password check timed out, please retry")
+        except BrokenProcessPool:
+            raise unavailable("Password check failed, please retry")
+
+    async def run_async(self, fn, *args):
+        """fn(*args) in a worker process, awaited without holding a thread"""
+        if self.workers <= 0:
+            return fn(*args)
+        future = self._submit(fn, *args)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), PASSWORD_HASH_TIMEOUT)
+        except asyncio.TimeoutError:
+            future.cancel()
+            raise unavailable("Password check timed out, please retry")
+        except BrokenProcessPool:
+            raise unavailable("Password check failed, please retry")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "in_flight": self.in_flight,
+                "queue_depth": max(0, self.in_flight - self.workers),
+                "peak_queue_depth": self.peak_queue_depth,
+                "queue_limit": self.queue_limit,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "restarts": self.restarts,
+            }
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+password_pool = PasswordHashPool(PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE_LIMIT)
 
 def hash_password(password: str) -> str:
     """Hash password using Argon2"""
-    return pwd_context.hash(password)
+    return password_pool.run(hashing.hash_password, password)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify password using Argon2"""
-    return pwd_context.verify(plain_password, hashed_password)
+    return password_pool.run(hashing.verify_password, plain_password, hashed_password)
+
+async def hash_password_async(password: str) -> str:
+    """Hash password using Argon2, from async request handlers"""
+    return await password_pool.run_async(hashing.hash_password, password)
 
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verify password using Argon2, from async request handlers"""
+    return await password_pool.run_async(hashing.verify_password, plain_password, hashed_password)
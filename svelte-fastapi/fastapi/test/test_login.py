@@ -130,3 +130,104 @@ def test_logout_success(test_client):
     )
 
     assert res.status_code in (200, 404)
+
+
+def test_verified_token_claims_are_cached_until_exp(monkeypatch):
+    import auth
+    from datetime import timedelta
+
+    auth.verified_tokens.clear()
+    token = auth.create_token({"sub": "cache@test.com", "role": "EMPLOYEE", "token_type": "access"}, timedelta(minutes=5))
+    calls = []
+    real_decode = auth.jwt.decode
+    monkeypatch.setattr(auth.jwt, "decode", lambda *a, **kw: calls.append(1) or real_decode(*a, **kw))
+
+    assert auth.verify_token(token)["sub"] == "cache@test.com"
+    assert auth.verify_token(token)["sub"] == "cache@test.com"
+    assert len(calls) == 1
+
+    digest = next(iter(auth.verified_tokens._entries))
+    claims, _ = auth.verified_tokens._entries[digest]
+    auth.verified_tokens._entries[digest] = (claims, 0)
+    auth.verify_token(token)
+    assert len(calls) == 2
+
+
+def test_auth_middleware_shares_decoded_claims():
+    from datetime import timedelta
+    from fastapi import Depends, FastAPI
+    from auth import create_token, get_current_user
+    from middleware import AuthMiddleware
+
+    protected = FastAPI()
+    protected.add_middleware(AuthMiddleware)
+
+    @protected.get("/whoami")
+    def whoami(user: dict = Depends(get_current_user)):
+        return user
+
+    client = TestClient(protected)
+    assert client.get("/openapi.json").status_code == 200
+    assert client.get("/whoami").json()["message"] == "Missing Authorization header"
+    assert client.get("/whoami", headers={"Authorization": "Bearer nope"}).json()["message"] == "Invalid token"
+
+    token = create_token({"sub": "mw@test.com", "role": "EMPLOYEE", "id": "e1", "token_type": "access"}, timedelta(minutes=5))
+    res = client.get("/whoami", headers={"Authorization": f"Bearer {token}"})
+    assert res.json() == {"user_email": "mw@test.com", "role": "EMPLOYEE", "id": "e1"}
+
+    refresh = create_token({"sub": "mw@test.com", "token_type": "refresh"}, timedelta(minutes=5))
+    assert client.get("/whoami", headers={"Authorization": f"Bearer {refresh}"}).status_code == 401
+
+
+def test_password_hash_pool_rejects_when_queue_is_full():
+    from fastapi import HTTPException
+    from security.security import PasswordHashPool, hash_password, verify_password
+
+    hashed = hash_password("password123")
+    assert verify_password("password123", hashed)
+    assert not verify_password("wrong", hashed)
+
+    pool = PasswordHashPool(workers=1, queue_limit=0)
+    pool.in_flight = 1
+    with pytest.raises(HTTPException) as exc:
+        pool.run(len, "x")
+    assert exc.value.status_code == 503
+    assert pool.stats()["rejected"] == 1
+
+
+def test_password_hash_pool_recovers_from_broken_workers(monkeypatch):
+    import asyncio
+    import os
+    import time
+    from concurrent.futures import Future
+    from fastapi import HTTPException
+    from security import hashing, security
+
+    pool = security.PasswordHashPool(workers=1, queue_limit=2)
+    try:
+        hashed = pool.run(hashing.hash_password, "password123")
+        assert asyncio.run(pool.run_async(hashing.verify_password, "password123", hashed))
+
+        # A worker dying breaks the executor; the call is a 503 and the next one gets a new pool
+        with pytest.raises(HTTPException) as exc:
+            pool.run(os._exit, 1)
+        assert exc.value.status_code == 503
+        assert pool.run(hashing.verify_password, "password123", hashed)
+        assert pool.stats()["restarts"] == 1
+
+        monkeypatch.setattr(security, "PASSWORD_HASH_TIMEOUT", 0.1)
+        with pytest.raises(HTTPException) as exc:
+            pool.run(time.sleep, 1)
+        assert exc.value.status_code == 503
+        with pytest.raises(HTTPException) as exc:
+            asyncio.run(pool.run_async(time.sleep, 1))
+        assert exc.value.status_code == 503
+
+        # A timed-out async call cancels its future, so a queued call gives its slot back
+        pending = Future()
+        monkeypatch.setattr(pool, "_submit", lambda fn, *args: pending)
+        with pytest.raises(HTTPException):
+            asyncio.run(pool.run_async(time.sleep, 1))
+        assert pending.cancelled()
+    finally:
+        pool.shutdown()
@@ -1,14 +1,26 @@
+import asyncio
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+import pytest
+from sqlalchemy import create_engine, delete, event, func, insert, select
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateTable
+from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.orm import selectinload, sessionmaker
 from main import app
-from database import Base
+from database import Base, raise_on_lazy_load
 from apis.orders.models import OrderBase
 from apis.orders_item.models import OrderItem
 from apis.product.models import ProductBase
 from apis.login.models import AdminBase
 from auth import get_current_user, require_admin, require_employee
-from datetime import datetime
+from apis.orders import service as order_service
+from apis.orders.service import apply_order_filters
+from apis.orders.events import broker, can_see
+from apis.orders.assignment import release_stale_claims
+from apis.orders.partitions import add_months, partition_month, partition_name
+from datetime import date, datetime
+import json
+from types import SimpleNamespace
 
 TEST_DB = "sqlite:///./test_orders.db"
 
@@ -47,6 +59,7 @@ def override_get_db():
 
 
 from apis.orders.routes import get_db as order_get_db
+from apis.orders_item.routes import get_db as items_get_db
 app.dependency_overrides[order_get_db] = override_get_db
 
 client = TestClient(app)
@@ -115,6 +128,13 @@ def test_get_order_detail_success():
     assert len(res.json()["items"]) == 1
 
 
+def test_get_order_detail_not_modified():
+    etag = client.get("/orders/o1").headers["etag"]
+
+    res = client.get("/orders/o1", headers={"If-None-Match": etag})
+    assert res.status_code == 304
+
+
 def test_get_order_detail_not_found():
     res = client.get("/orders/unknown")
     assert res.status_code == 404
@@ -139,6 +159,33 @@ def test_update_order_cancelled_updates_stock():
    db.close()
 
 
+def test_update_order_cancel_twice_restores_stock_once():
+    db = TestingSessionLocal()
+    db.add(ProductBase(id="cx-p", product_name="Cancel", category="A", description="Test", rating=4, price=10, stock=7))
+    db.add(OrderBase(id="cx-o", customer_name="C", email="c@x.com", phone="1", address="HN", status="PENDING"))
+    db.commit()
+    db.add(OrderItem(id="cx-i", order_id="cx-o", product_id="cx-p", product_name="Cancel", qty=3, price=10))
+    db.commit()
+    db.close()
+
+    def stock():
+        db = TestingSessionLocal()
+        try:
+            return db.query(ProductBase.stock).filter(ProductBase.id == "cx-p").scalar()
+        finally:
+            db.close()
+
+    payload = {"status": "CANCELLED", "customer_name": "C", "email": "c@x.com", "phone": "1", "address": "HN"}
+    assert client.put("/orders/cx-o", json=payload).status_code == 200
+    assert stock() == 10
+    assert client.put("/orders/cx-o", json=payload).status_code == 200
+    assert stock() == 10
+
+    res = client.put("/orders/cx-o", json={**payload, "status": "PENDING"})
+    assert res.status_code == 400
+    assert stock() == 10
+
+
 def test_delete_order_success():
     res = client.delete("/orders/o1")
     assert res.status_code == 200
@@ -151,6 +198,24 @@ def test_delete_order_success():
     db.close()
 
 
+def test_order_changes_are_published():
+    db = TestingSessionLocal()
+    db.add(OrderBase(id="ev1", customer_name="Eve", email="e@x.com", phone="1", address="HN", status="PENDING"))
+    db.commit()
+    db.close()
+    _, seen = broker.replay(0)
+
+    payload = {"status": "PROCESSING", "customer_name": "Eve", "email": "e@x.com", "phone": "1", "address": "HN"}
+    assert client.put("/orders/ev1", json=payload).status_code == 200
+    assert client.delete("/orders/ev1").status_code == 200
+
+    events, last_id = broker.replay(seen)
+    assert [(e["type"], e["order_id"]) for e in events] == [("order.updated", "ev1"), ("order.deleted", "ev1")]
+    assert [e["id"] for e in events] == [seen + 1, seen + 2] and last_id == seen + 2
+    # An id this broker never issued replays the whole buffer
+    assert broker.replay(last_id + 100)[0][-2:] == events
+
+
 def test_delete_order_not_found():
     res = client.delete("/orders/nonexistent")
     assert res.status_code == 404
@@ -205,3 +270,305 @@ def test_assign_order_fail_non_employee():
     res = client.post("/orders/o2/assign", json={"order_id": "o2", "employee_id": "admin1"})
     assert res.status_code == 400
     assert "Only employees" in res.json()["detail"]
+
+
+def explain(query):
+    sql = str(query.statement.compile(engine, compile_kwargs={"literal_binds": True}))
+    with engine.connect() as conn:
+        return " ".join(row[-1] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}"))
+
+
+def test_order_filters_use_indexes():
+    db = TestingSessionLocal()
+    base = db.query(OrderBase)
+
+    plan = explain(apply_order_filters(db, base, status="PENDING"))
+    assert "ix_orders_status_created_at_id" in plan
+
+    plan = explain(apply_order_filters(db, base, employee_id="emp2"))
+    assert "ix_orders_employee_id_created_at_id" in plan
+
+    # Id prefixes are an escaped LIKE, so wildcards in the search match literally
+    assert {o.id for o in apply_order_filters(db, base, search_id=" o2 ")} == {"o2"}
+    assert apply_order_filters(db, base, search_id="%").count() == 0
+    assert apply_order_filters(db, base, search_id="  ").count() == base.count()
+
+    plan = explain(apply_order_filters(db, base, customer_name="ali"))
+    assert "orders_fts VIRTUAL TABLE INDEX" in plan
+    db.close()
+
+
+def test_backfill_adds_filter_indexes_and_fts_to_existing_tables():
+    from apis.orders.backfill import create_search_structures
+    # Tables created before the filter indexes and orders_fts existed
+    with engine.begin() as conn:
+        conn.exec_driver_sql("DROP TABLE orders_fts")
+        for trigger in ("ai", "ad", "au"):
+            conn.exec_driver_sql(f"DROP TRIGGER orders_fts_{trigger}")
+        conn.exec_driver_sql("DROP INDEX ix_orders_status_created_at_id")
+        conn.exec_driver_sql("DROP INDEX ix_orders_employee_id_created_at_id")
+
+    create_search_structures(engine)
+    create_search_structures(engine)
+
+    db = TestingSessionLocal()
+    base = db.query(OrderBase)
+    assert "ix_orders_status_created_at_id" in explain(apply_order_filters(db, base, status="PENDING"))
+    assert "ix_orders_employee_id_created_at_id" in explain(apply_order_filters(db, base, employee_id="emp2"))
+    expected = {o.id for o in base.filter(OrderBase.customer_name.ilike("%ali%"))}
+    assert expected
+    assert {o.id for o in apply_order_filters(db, base, customer_name="ali")} == expected
+    db.close()
+
+
+def test_order_customer_name_filter():
+    res = client.get("/orders", params={"customer_name": "ali"})
+    assert [o["id"] for o in res.json()["search_result"]] == ["o2"]
+
+
+def test_order_events_are_filtered_by_role():
+    event = {"id": 1, "type": "order.assigned", "employee_id": "emp2"}
+    assert can_see(event, {"role": "ADMIN"})
+    assert not can_see(event, {"role": "ADMIN"}, employee_id="emp9")
+    assert can_see(event, {"role": "EMPLOYEE", "id": "emp2"})
+    assert not can_see(event, {"role": "EMPLOYEE", "id": "emp9"}, employee_id="emp2")
+    # Unassigned orders are visible to every employee, but not to an admin's per-employee view
+    unassigned = {"id": 2, "type": "order.released", "employee_id": None}
+    assert can_see(unassigned, {"role": "EMPLOYEE", "id": "emp9"})
+    assert not can_see(unassigned, {"role": "ADMIN"}, employee_id="emp2")
+    assert not can_see(unassigned, {"role": "EMPLOYEE"})
+
+
+def test_employee_subscriber_receives_checkout_events():
+    db = TestingSessionLocal()
+    db.add(ProductBase(id="ev-p", product_name="Event Product", category="A", description="", rating=0, price=5, stock=5))
+    db.commit()
+    db.close()
+    payload = {
+        "customer": {"customer_id": "c1", "name": "Eve", "email": "e@x.com", "phone": "1", "address": "HN"},
+        "cart": [{"product_id": "ev-p", "product_name": "Event Product", "qty": 1, "price": 5}],
+    }
+
+    async def receive_checkout():
+        subscriber = broker.subscribe()
+        try:
+            res = client.post("/checkout", json=payload)
+            assert res.status_code == 200
+            event = await asyncio.wait_for(subscriber[1].get(), timeout=5)
+            return res.json()["order_id"], event
+        finally:
+            broker.unsubscribe(subscriber)
+
+    app.dependency_overrides[items_get_db] = override_get_db
+    try:
+        order_id, event = asyncio.run(receive_checkout())
+    finally:
+        del app.dependency_overrides[items_get_db]
+
+    assert (event["type"], event["order_id"], event["employee_id"]) == ("order.created", order_id, None)
+    assert can_see(event, {"role": "EMPLOYEE", "id": "emp9"})
+
+
+def test_partition_month_arithmetic():
+    assert add_months(date(2024, 11, 1), 3) == date(2025, 2, 1)
+    assert add_months(date(2024, 1, 1), -1) == date(2023, 12, 1)
+    assert partition_name("orders", date(2024, 3, 1)) == "orders_p202403"
+    assert partition_month("orders", "orders_p202403") == date(2024, 3, 1)
+    assert partition_month("orders", "order_items_p202403") is None
+    assert partition_month("orders", "orders_default") is None
+
+
+def test_order_items_reference_orders_with_a_cascading_key():
+    ddl = str(CreateTable(OrderItem.__table__).compile(dialect=postgresql.dialect()))
+    assert "FOREIGN KEY(order_id, order_created_at) REFERENCES orders (id, created_at) ON DELETE CASCADE" in ddl
+
+    # The same DDL on a database that enforces foreign keys
+    fk_engine = create_engine("sqlite://")
+    event.listen(fk_engine, "connect", lambda conn, _: conn.execute("PRAGMA foreign_keys=ON"))
+    Base.metadata.create_all(fk_engine)
+    with fk_engine.begin() as conn:
+        conn.execute(insert(OrderBase), {"id": "fk1", "created_at": datetime(2024, 1, 2)})
+        conn.execute(insert(OrderItem), {"id": "fk1-i", "order_id": "fk1", "qty": 1, "price": 1})
+        assert conn.execute(select(OrderItem.order_created_at)).scalar() == datetime(2024, 1, 2)
+        conn.execute(delete(OrderBase).where(OrderBase.id == "fk1"))
+        assert conn.execute(select(func.count()).select_from(OrderItem)).scalar() == 0
+
+
+def test_delete_order_deletes_its_items():
+    db = TestingSessionLocal()
+    db.add(OrderBase(id="del1", customer_name="D", email="d@x.com", phone="1", address="HN", status="PENDING"))
+    db.commit()
+    db.add(OrderItem(id="del1-i", order_id="del1", product_id="p1", product_name="Product 1", qty=1, price=50))
+    db.commit()
+    db.close()
+
+    assert len(client.get("/orders/del1").json()["items"]) == 1
+    assert client.delete("/orders/del1").status_code == 200
+    db = TestingSessionLocal()
+    assert db.query(OrderItem).filter(OrderItem.id == "del1-i").count() == 0
+    db.close()
+
+
+def test_export_orders_streams_csv_and_ndjson():
+    listed = {o["id"] for o in client.get("/orders", params={"limit": 100}).json()["search_result"]}
+
+    res = client.get("/orders/export", params={"format": "ndjson", "include_items": True})
+    assert res.status_code == 200
+    assert res.headers["content-type"].startswith("application/x-ndjson")
+    orders = [json.loads(line) for line in res.text.splitlines()]
+    assert {o["id"] for o in orders} == listed
+    assert all(len(o["items"]) == o["item_count"] or o["item_count"] == 0 for o in orders)
+
+    res = client.get("/orders/export", params={"status": "assigned"})
+    lines = res.text.splitlines()
+    assert lines[0].startswith("id,customer_name,")
+    assert all(",ASSIGNED," in line for line in lines[1:])
+
+    assert client.get("/orders/export", params={"start": "2024-02-01", "end": "2024-01-01"}).status_code == 400
+
+
+@pytest.fixture
+def raiseload_db():
+    """A session with the raiseload guard on, whatever TESTING/ORM_RAISELOAD say"""
+    db = TestingSessionLocal()
+    event.listen(db, "do_orm_execute", raise_on_lazy_load)
+    yield db
+    db.close()
+
+
+def test_lazy_relationship_loads_raise_under_the_guard(raiseload_db):
+    db = raiseload_db
+    db.add(OrderBase(id="lazy1", customer_name="Lazy"))
+    db.add(OrderItem(id="lazy1-i", order_id="lazy1", product_id="p1", qty=1, price=1))
+    db.commit()
+    db.expunge_all()
+
+    order = db.query(OrderBase).filter(OrderBase.id == "lazy1").first()
+    with pytest.raises(InvalidRequestError):
+        order.items
+
+    order = db.query(OrderBase).options(selectinload(OrderBase.items)).filter(OrderBase.id == "lazy1").first()
+    assert [i.id for i in order.items] == ["lazy1-i"]
+    db.delete(order)
+    db.query(OrderItem).filter(OrderItem.id == "lazy1-i").delete()
+    db.commit()
+
+
+def test_bulk_assign_and_status_report_per_order():
+    db = TestingSessionLocal()
+    db.add_all([
+        OrderBase(id="b1", customer_name="Bulk One", status="PENDING"),
+        OrderBase(id="b2", customer_name="Bulk Two", status="PENDING"),
+        OrderItem(id="b1-i", order_id="b1", product_id="p1", product_name="Product 1", qty=3, price=50),
+    ])
+    db.commit()
+    stock = db.query(ProductBase.stock).filter(ProductBase.id == "p1").scalar()
+    db.close()
+
+    res = client.post("/orders/bulk/assign", json={"order_ids": ["b1", "b2", "missing"], "employee_id": "emp2"})
+    assert res.status_code == 200
+    data = res.json()
+    assert data["updated"] == 2
+    assert [r["ok"] for r in data["results"]] == [True, True, False]
+
+    res = client.post("/orders/bulk/status", json={"order_ids": ["b1", "b2"], "status": "CANCELLED"})
+    assert res.json()["updated"] == 2
+    res = client.post("/orders/bulk/status", json={"order_ids": ["b1"], "status": "SHIPPED"})
+    assert res.json()["results"][0]["error"] == "Order is already cancelled"
+
+    db = TestingSessionLocal()
+    orders = db.query(OrderBase).filter(OrderBase.id.in_(["b1", "b2"])).all()
+    assert {(o.status, o.assigned_to) for o in orders} == {("CANCELLED", "Bob")}
+    assert db.query(ProductBase.stock).filter(ProductBase.id == "p1").scalar() == stock + 3
+    db.close()
+
+    res = client.post("/orders/bulk/assign", json={"order_ids": ["b1"], "employee_id": "admin1"})
+    assert res.status_code == 400
+
+
+def test_bulk_status_reports_orders_changed_after_the_check(monkeypatch):
+    db = TestingSessionLocal()
+    db.add_all([
+        OrderBase(id="race1", customer_name="Race", status="CANCELLED"),
+        OrderBase(id="race2", customer_name="Race", status="PENDING"),
+    ])
+    db.commit()
+    db.close()
+
+    # The first check sees race1 before it was cancelled, like a concurrent cancel would
+    lock_bulk_orders = order_service.lock_bulk_orders
+    stale = [True]
+    def lock_with_stale_read(db, order_ids):
+        orders = lock_bulk_orders(db, order_ids)
+        if stale.pop() if stale else False:
+            orders["race1"] = SimpleNamespace(id="race1", status="PENDING", employee_id=None)
+        return orders
+    monkeypatch.setattr(order_service, "lock_bulk_orders", lock_with_stale_read)
+
+    res = client.post("/orders/bulk/status", json={"order_ids": ["race1", "race2"], "status": "SHIPPED"})
+    assert res.status_code == 200
+    assert res.json()["updated"] == 1
+    assert [(r["ok"], r["error"]) for r in res.json()["results"]] == [(False, "Order is already cancelled"), (True, None)]
+
+    stale.extend([True] * order_service.BULK_ATTEMPTS)
+    res = client.post("/orders/bulk/status", json={"order_ids": ["race1", "race2"], "status": "COMPLETED"})
+    assert res.status_code == 200
+    assert res.json()["updated"] == 0
+    assert {r["error"] for r in res.json()["results"]} == {order_service.BULK_CONFLICT}
+    db = TestingSessionLocal()
+    assert db.query(OrderBase.status).filter(OrderBase.id == "race2").scalar() == "SHIPPED"
+    db.close()
+
+
+def test_auto_assignment_balances_pending_orders():
+    db = TestingSessionLocal()
+    db.add(AdminBase(id="emp3", employee_name="Carol", email="carol@example.com", password="hashed", role="EMPLOYEE"))
+    db.add_all([OrderBase(id=f"auto{i}", customer_name="Auto", status="PENDING") for i in range(3)])
+    db.commit()
+    db.close()
+
+    res = client.post("/orders/assignment/run")
+    assert res.status_code == 200
+    assert res.json()["assigned"] >= 3
+
+    db = TestingSessionLocal()
+    orders = db.query(OrderBase).filter(OrderBase.id.like("auto%")).all()
+    assert all(o.status == "ASSIGNED" and o.employee_id in ("emp2", "emp3") for o in orders)
+    loads = dict(
+        db.query(OrderBase.employee_id, func.count())
+        .filter(OrderBase.status == "ASSIGNED")
+        .group_by(OrderBase.employee_id)
+        .all()
+    )
+    assert abs(loads["emp2"] - loads["emp3"]) <= 1
+    db.close()
+
+    stats = client.get("/orders/assignment/metrics").json()
+    assert stats["queue_depth"] == 0
+    assert stats["latency_seconds"]["max"] is not None
+
+
+def test_claim_orders_for_caller_and_release_stale_claims():
+    db = TestingSessionLocal()
+    db.add(AdminBase(id="emp1", employee_name="Eve", email="eve@example.com", password="hashed", role="EMPLOYEE"))
+    db.add_all([OrderBase(id=f"claim{i}", customer_name="Claim", status="PENDING") for i in range(3)])
+    db.commit()
+    db.close()
+
+    res = client.post("/orders/claim", params={"n": 2})
+    assert res.status_code == 200
+    claimed = [o["id"] for o in res.json()["claimed"]]
+    assert len(claimed) == 2
+    assert client.post("/orders/claim", params={"n": 2}).json()["claimed_count"] == 1
+
+    db = TestingSessionLocal()
+    db.query(OrderBase).filter(OrderBase.id == claimed[0]).update(
+        {OrderBase.claimed_at: datetime(2000, 1, 1)}, synchronize_session=False
+    )
+    db.commit()
+    assert release_stale_claims(db) == 1
+    order = db.query(OrderBase).filter(OrderBase.id == claimed[0]).first()
+    assert (order.status, order.employee_id, order.claimed_at) == ("PENDING", None, None)
+    db.close()
+
+    assert client.post("/orders/claim", params={"n": 0}).status_code == 422
@@ -1,12 +1,18 @@
+import base64
+import json
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy.orm import Session
 import uuid
 from main import app
 from database import Base, engine, SessionLocal
+from sqlalchemy import event
 from apis.product.models import ProductBase
 from apis.orders.models import OrderBase
 from apis.orders_item.models import OrderItem
+from apis.orders_item.idempotency import response_cache
+from apis.reports.models import SalesDailyRollup, SalesRollupDelta
+from apis.reports.service import rebuild_sales_rollups
 
 # --- Fixtures ---
 @pytest.fixture(scope="module")
@@ -83,6 +89,173 @@ def test_checkout_fail_insufficient_stock(client, db_session):
     assert "chỉ còn" in res.json()["detail"]
 
 
+def test_checkout_split_lines_cannot_oversell(client, db_session):
+    product = seed_product(db_session)
+    line = {"product_id": product.id, "product_name": product.product_name, "qty": 6, "price": product.price}
+    payload = {
+        "customer": {"customer_id": "1234", "name": "Jane", "email": "jane@example.com", "phone": "456", "address": "Address"},
+        "cart": [line, line]
+    }
+    res = client.post("/checkout", json=payload)
+    assert res.status_code == 400
+
+    db = SessionLocal()
+    assert db.query(ProductBase).filter(ProductBase.id == product.id).first().stock == 10
+    db.close()
+
+
+def test_checkout_reserves_stock_last_without_locking_first(client, db_session):
+    product = seed_product(db_session)
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    def record_commit(conn):
+        statements.append("COMMIT")
+
+    payload = {
+        "customer": {"customer_id": "1234", "name": "John Doe", "email": "john@example.com", "phone": "123", "address": "Address"},
+        "cart": [{"product_id": product.id, "product_name": product.product_name, "qty": 1, "price": product.price}]
+    }
+    event.listen(engine, "before_cursor_execute", record)
+    event.listen(engine, "commit", record_commit)
+    try:
+        assert client.post("/checkout", json=payload).status_code == 200
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+        event.remove(engine, "commit", record_commit)
+
+    # The guarded UPDATE is the only statement touching products' rows, right before the commit
+    commit = statements.index("COMMIT")
+    assert statements[commit - 1].startswith("UPDATE products SET stock")
+    assert not any("FOR UPDATE" in s for s in statements)
+
+
+def test_checkout_failure_leaves_no_order(client, db_session):
+    product = seed_product(db_session)
+    orders_before = db_session.query(OrderBase).count()
+    payload = {
+        "customer": {"customer_id": "1234", "name": "Jane", "email": "jane@example.com", "phone": "456", "address": "Address"},
+        "cart": [
+            {"product_id": product.id, "product_name": product.product_name, "qty": 1, "price": product.price},
+            {"product_id": "missing", "product_name": "Ghost", "qty": 1, "price": 1},
+        ]
+    }
+    res = client.post("/checkout", json=payload)
+    assert res.status_code == 404
+    assert "Ghost" in res.json()["detail"]
+
+    db = SessionLocal()
+    assert db.query(OrderBase).count() == orders_before
+    assert db.query(ProductBase).filter(ProductBase.id == product.id).first().stock == 10
+    db.close()
+
+
+def test_checkout_idempotency_key_replays_response(client, db_session):
+    product = seed_product(db_session)
+    payload = {
+        "customer": {"customer_id": "1234", "name": "John Doe", "email": "john@example.com", "phone": "123", "address": "Address"},
+        "cart": [{"product_id": product.id, "product_name": product.product_name, "qty": 2, "price": product.price}]
+    }
+    key = str(uuid.uuid4())
+    first = client.post("/checkout", json=payload, headers={"Idempotency-Key": key})
+    retry = client.post("/checkout", json=payload, headers={"Idempotency-Key": key})
+    assert first.status_code == retry.status_code == 200
+    assert retry.json()["order_id"] == first.json()["order_id"]
+    assert retry.headers["idempotent-replayed"] == "true"
+
+    # Replays also come from the table once the in-process cache is gone
+    response_cache.invalidate()
+    retry = client.post("/checkout", json=payload, headers={"Idempotency-Key": key})
+    assert retry.json()["order_id"] == first.json()["order_id"]
+
+    db = SessionLocal()
+    assert db.query(ProductBase).filter(ProductBase.id == product.id).first().stock == 8
+    db.close()
+
+    payload["cart"][0]["qty"] = 1
+    res = client.post("/checkout", json=payload, headers={"Idempotency-Key": key})
+    assert res.status_code == 422
+
+
+def test_order_totals_follow_checkout_and_item_deletion(client, db_session):
+    product = seed_product(db_session)
+    payload = {
+        "customer": {"customer_id": "1234", "name": "John Doe", "email": "john@example.com", "phone": "123", "address": "Address"},
+        "cart": [{"product_id": product.id, "product_name": product.product_name, "qty": 2, "price": product.price}]
+    }
+    order_id = client.post("/checkout", json=payload).json()["order_id"]
+
+    db = SessionLocal()
+    order = db.query(OrderBase).filter(OrderBase.id == order_id).first()
+    assert (order.total_amount, order.item_count) == (200, 1)
+    item_id = db.query(OrderItem).filter(OrderItem.order_id == order_id).first().id
+    db.close()
+
+    client.delete(f"/order_items/{item_id}")
+    db = SessionLocal()
+    order = db.query(OrderBase).filter(OrderBase.id == order_id).first()
+    assert (order.total_amount, order.item_count) == (0, 0)
+    db.close()
+
+
+def test_sales_rollups_follow_checkout_and_rebuild(client, db_session):
+    product = seed_product(db_session)
+    payload = {
+        "customer": {"customer_id": "1234", "name": "John Doe", "email": "john@example.com", "phone": "123", "address": "Address"},
+        "cart": [{"product_id": product.id, "product_name": product.product_name, "qty": 3, "price": product.price}]
+    }
+    order_id = client.post("/checkout", json=payload).json()["order_id"]
+
+    def product_sales():
+        rows = client.get(f"/reports/sales?dimension=product&key={product.id}").json()["rows"]
+        return [(r["orders"], r["units"], r["revenue"]) for r in rows]
+
+    assert product_sales() == [(1, 3, 300)]
+
+    db = SessionLocal()
+    rebuild_sales_rollups(db)
+    db.close()
+    assert product_sales() == [(1, 3, 300)]
+
+    item_id = client.get(f"/order_items?order_id={order_id}").json()["search_result"][0]["id"]
+    client.delete(f"/order_items/{item_id}")
+    assert product_sales() == []
+
+
+
+def test_checkout_queues_rollup_deltas_with_the_checkout_category(client, db_session):
+    product = seed_product(db_session)
+    payload = {
+        "customer": {"customer_id": "1234", "name": "John Doe", "email": "john@example.com", "phone": "123", "address": "Address"},
+        "cart": [{"product_id": product.id, "product_name": product.product_name, "qty": 2, "price": product.price}]
+    }
+    assert client.post("/checkout", json=payload).status_code == 200
+
+    # The checkout only appended deltas; no rollup row was written yet
+    db = SessionLocal()
+    pending = db.query(SalesRollupDelta).filter(SalesRollupDelta.key == product.id).all()
+    assert [(d.dimension, d.orders, d.units) for d in pending] == [("product", 1, 2)]
+    assert db.query(SalesDailyRollup).filter(SalesDailyRollup.key == product.id).count() == 0
+    db.query(ProductBase).filter(ProductBase.id == product.id).update({"category": "Renamed"})
+    db.commit()
+    db.close()
+
+    def category_units(category):
+        rows = client.get("/reports/sales", params={"dimension": "category", "key": category}).json()["rows"]
+        return sum(r["units"] for r in rows)
+
+    before = category_units("Category1")
+    assert category_units("Renamed") == 0
+    db = SessionLocal()
+    rebuild_sales_rollups(db)
+    db.close()
+    assert (category_units("Category1"), category_units("Renamed")) == (before, 0)
+    db = SessionLocal()
+    assert db.query(SalesRollupDelta).count() == 0
+    db.close()
+
 def test_get_order_items(client, db_session):
     order = seed_order(db_session)
     db_session.add(OrderItem(
@@ -97,6 +270,29 @@ def test_get_order_items(client, db_session):
     assert data["items_count"] == 1
 
 
+def test_get_order_items_cursor_pagination(client, db_session):
+    order = seed_order(db_session)
+    for i in range(3):
+        db_session.add(OrderItem(
+            id=f"cur{i}", order_id=order.id, product_id="prod1",
+            product_name="Test Product", qty=1, price=100
+        ))
+    db_session.commit()
+
+    first = client.get(f"/order_items?order_id={order.id}&limit=2").json()
+    second = client.get(f"/order_items?order_id={order.id}&limit=2&next_cursor={first['next_cursor']}").json()
+    ids = [i["id"] for i in first["search_result"] + second["search_result"]]
+    assert sorted(ids) == ["cur0", "cur1", "cur2"]
+    assert second["next_cursor"] is None
+
+    assert client.get("/order_items?page=1000").status_code == 400
+    assert client.get("/order_items?next_cursor=bogus").status_code == 400
+    # Well-formed base64 JSON with a bad date or missing keys is rejected the same way
+    for cursor in ({"date": "yesterday", "id": "x"}, {"id": "x"}, ["x"]):
+        token = base64.b64encode(json.dumps(cursor).encode()).decode()
+        assert client.get("/order_items", params={"next_cursor": token}).status_code == 400
+
+
 def test_delete_order_item(client, db_session):
     order = seed_order(db_session)
     item = OrderItem(
@@ -1,3 +1,4 @@
+import json
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
@@ -107,3 +108,48 @@ def test_delete_product(client):
     assert resp.json()["detail"] == "Product not found"
 
 
+
+
+def test_bulk_import_products_csv(client):
+    body = (
+        "id,product_name,category,description,rating,price,stock\n"
+        "imp-1,Import A,Drone,Desc,4.0,10.5,3\n"
+        "imp-2,Import B,Drone,Desc,not-a-number,12,1\n"
+        "imp-3,Import C,Drone,Desc,5,20,7\n"
+    )
+    resp = client.post("/admin/products/import", content=body, headers={"Content-Type": "text/csv"})
+    assert resp.status_code == 200
+    data = resp.json()
+    assert data["rows"] == 3
+    assert data["inserted"] == 2
+    assert data["failed"] == 1
+    assert data["errors"][0]["row"] == 3
+
+
+def test_bulk_import_products_ndjson_reports_duplicates(client):
+    row = {**sample_product, "id": "imp-nd-1"}
+    body = "\n".join(json.dumps(r) for r in [row, row, {**row, "id": "imp-nd-2"}])
+    resp = client.post("/admin/products/import", content=body, headers={"Content-Type": "application/x-ndjson"})
+    data = resp.json()
+    assert data["inserted"] == 2
+    assert data["failed"] == 1
+    assert data["errors"][0]["row"] == 2
+
+
+def test_bulk_import_products_reports_invalid_utf8_lines(client):
+    body = (
+        b"id,product_name,category,description,rating,price,stock\n"
+        b"imp-u1,Import \xff,Drone,Desc,4.0,10.5,3\n"
+        b"imp-u2,Import B,Drone,Desc,4.0,12,1\n"
+    )
+    resp = client.post("/admin/products/import", content=body, headers={"Content-Type": "text/csv"})
+    assert resp.status_code == 200
+    data = resp.json()
+    assert (data["rows"], data["inserted"], data["failed"]) == (2, 1, 1)
+    assert data["errors"][0]["row"] == 2
+    assert "UTF-8" in data["errors"][0]["error"]
+
+
+def test_bulk_import_products_rejects_unknown_format(client):
+    resp = client.post("/admin/products/import", content="x", headers={"Content-Type": "text/plain"})
+    assert resp.status_code == 400
@@ -1,12 +1,15 @@
+import base64
+import json
 from datetime import datetime
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect
 from sqlalchemy.orm import sessionmaker
 from main import app
 from database import Base
 from apis.product.models import ProductBase
 from apis.product.router_client import get_db
+from apis.product.cache import catalog_cache
 
 # ---------------------------------
 # Setup Test Database SQLite
@@ -38,6 +41,7 @@ client = TestClient(app)
 @pytest.fixture(autouse=True)
 def reset_database():
     """Reset database trước mỗi test"""
+    app.dependency_overrides[get_db] = override_get_db
     Base.metadata.drop_all(bind=engine)
     Base.metadata.create_all(bind=engine)
     yield
@@ -71,4 +75,207 @@ def test_list_products_empty():
 def test_get_product_detail_not_found():
     res = client.get("/products/unknown")
     assert res.status_code == 404
-    assert res.json()["detail"] == "Product not found"
\ No newline at end of file
+    assert res.json()["detail"] == "Product not found"
+
+def test_list_products_price_sort_paginates_without_repeats():
+    db = TestingSessionLocal()
+    for i, price in enumerate([30.0, 10.0, 20.0, 10.0, 40.0]):
+        db.add(ProductBase(
+            id=f"p{i}", product_name=f"Product {i}", category="Category1",
+            description="A product", rating=4.0, price=price, stock=1,
+            created_at=datetime.utcnow(), updated_at=datetime.utcnow(),
+        ))
+    db.commit()
+    db.close()
+
+    seen = []
+    cursor = None
+    for _ in range(3):
+        params = {"limit": 2, "sort_by": "price-asc"}
+        if cursor:
+            params["next_cursor"] = cursor
+        data = client.get("/products", params=params).json()
+        seen += [(p["price"], p["id"]) for p in data["search_result"]]
+        cursor = data["next_cursor"]
+
+    assert seen == sorted(seen)
+    assert [pid for _, pid in seen] == ["p1", "p3", "p2", "p0", "p4"]
+
+
+def test_list_products_rating_sort_pages_through_ties():
+    db = TestingSessionLocal()
+    for i, rating in enumerate([3.0, 5.0, 3.0, 4.0, 3.0]):
+        db.add(ProductBase(
+            id=f"r{i}", product_name=f"Product {i}", category="Category1",
+            description="A product", rating=rating, price=10.0, stock=1,
+            created_at=datetime.utcnow(), updated_at=datetime.utcnow(),
+        ))
+    db.commit()
+    db.close()
+
+    seen = []
+    cursor = None
+    for _ in range(3):
+        params = {"limit": 2, "sort_by": "rating"}
+        if cursor:
+            params["next_cursor"] = cursor
+        data = client.get("/products", params=params).json()
+        seen += [p["id"] for p in data["search_result"]]
+        cursor = data["next_cursor"]
+
+    assert seen == ["r1", "r3", "r4", "r2", "r0"]
+
+
+def test_list_products_rejects_malformed_cursors():
+    create_sample_product("c1", "Product 1")
+
+    def cursor(payload):
+        return base64.b64encode(json.dumps(payload).encode()).decode()
+
+    malformed = [
+        "not a cursor!",
+        cursor([1]),
+        cursor(1),
+        cursor("x"),
+        cursor({"sort": "price-asc", "id": ["a"], "value": 1}),
+        cursor({"sort": "price-asc", "id": "a", "value": "1"}),
+        cursor({"sort": "featured", "id": "a", "value": 1}),
+        cursor({"sort": "unknown", "id": "a", "value": 1}),
+    ]
+    for next_cursor in malformed:
+        res = client.get("/products", params={"sort_by": "price-asc", "next_cursor": next_cursor})
+        assert res.status_code == 400, next_cursor
+
+    valid = cursor({"sort": "price-asc", "id": "a", "value": 1})
+    res = client.get("/products", params={"sort_by": "price-asc", "next_cursor": valid})
+    assert [p["id"] for p in res.json()["search_result"]] == ["c1"]
+
+
+def test_search_products_by_name_prefix():
+    create_sample_product("d1", "Racing Drone X")
+    create_sample_product("d2", "Camera Gimbal")
+    create_sample_product("d3", "Drone Battery Pack")
+
+    first = client.get("/products", params={"search_product": "dro", "limit": 1}).json()
+    second = client.get(
+        "/products",
+        params={"search_product": "dro", "limit": 1, "next_cursor": first["next_cursor"]},
+    ).json()
+    ids = {p["id"] for p in first["search_result"] + second["search_result"]}
+    assert ids == {"d1", "d3"}
+
+    res = client.get("/products", params={"search_product": "drone racing"})
+    assert [p["id"] for p in res.json()["search_result"]] == ["d1"]
+
+
+def test_search_products_by_id_prefix_escapes_wildcards():
+    create_sample_product("ab_1", "Product 1")
+    create_sample_product("abc2", "Product 2")
+
+    res = client.get("/products", params={"search_id": "ab_"})
+    assert [p["id"] for p in res.json()["search_result"]] == ["ab_1"]
+    assert client.get("/products", params={"search_id": "%"}).json()["search_result"] == []
+
+
+def test_backfill_adds_search_structures_to_an_existing_table():
+    from apis.product.backfill import backfill_products
+    create_sample_product("d1", "Racing Drone X")
+    # A products table created before full-text search: no FTS table, triggers or new indexes
+    with engine.begin() as conn:
+        conn.exec_driver_sql("DROP TABLE products_fts")
+        for trigger in ("ai", "ad", "au"):
+            conn.exec_driver_sql(f"DROP TRIGGER products_fts_{trigger}")
+        conn.exec_driver_sql("DROP INDEX ix_products_price_id")
+
+    backfill_products(engine)
+    backfill_products(engine)
+
+    with engine.connect() as conn:
+        assert "ix_products_price_id" in {i["name"] for i in inspect(conn).get_indexes("products")}
+    create_sample_product("d2", "Drone Battery Pack")
+    res = client.get("/products", params={"search_product": "dro"})
+    assert sorted(p["id"] for p in res.json()["search_result"]) == ["d1", "d2"]
+
+
+def test_total_product_follows_inserts_and_deletes():
+    create_sample_product("t1", "Product 1")
+    assert client.get("/products").json()["total_product"] == 1
+
+    create_sample_product("t2", "Product 2")
+    assert client.get("/products").json()["total_product"] == 2
+
+    db = TestingSessionLocal()
+    db.delete(db.query(ProductBase).filter(ProductBase.id == "t1").first())
+    db.commit()
+    db.close()
+    assert client.get("/products").json()["total_product"] == 1
+
+
+def test_product_detail_is_cached_until_product_changes():
+    create_sample_product("c1", "Cached Drone")
+
+    hits = catalog_cache.stats()["hits"]
+    assert client.get("/products/c1").json()["stock"] == 10
+    assert client.get("/products/c1").json()["stock"] == 10
+    assert catalog_cache.stats()["hits"] == hits + 1
+
+    db = TestingSessionLocal()
+    db.query(ProductBase).filter(ProductBase.id == "c1").first().stock = 3
+    db.commit()
+    db.close()
+    assert client.get("/products/c1").json()["stock"] == 3
+
+
+def test_product_detail_conditional_get():
+    create_sample_product("e1", "Tagged Drone")
+
+    res = client.get("/products/e1")
+    etag = res.headers["etag"]
+    res = client.get("/products/e1", headers={"If-None-Match": etag})
+    assert res.status_code == 304
+    assert res.content == b""
+
+    client.get("/products", params={"limit": 5})
+    listing = client.get("/products", params={"limit": 5})
+    res = client.get("/products", params={"limit": 5}, headers={"If-None-Match": listing.headers["etag"]})
+    assert res.status_code == 304
+
+    db = TestingSessionLocal()
+    db.query(ProductBase).filter(ProductBase.id == "e1").first().stock = 1
+    db.commit()
+    db.close()
+    res = client.get("/products/e1", headers={"If-None-Match": etag})
+    assert res.status_code == 200
+    assert res.headers["etag"] != etag
+
+
+
+def test_listing_etag_changes_when_a_product_is_deleted():
+    # The deleted product is the older one, so max(updated_at) does not move
+    create_sample_product("x2", "Deleted")
+    create_sample_product("x1", "Kept")
+    listing = client.get("/products", params={"limit": 5})
+
+    db = TestingSessionLocal()
+    db.delete(db.query(ProductBase).filter(ProductBase.id == "x2").first())
+    db.commit()
+    db.close()
+
+    res = client.get("/products", params={"limit": 5}, headers={"If-None-Match": listing.headers["etag"]})
+    assert res.status_code == 200
+    assert [p["id"] for p in res.json()["search_result"]] == ["x1"]
+
+def test_batch_lookup_returns_found_and_missing():
+    create_sample_product("b1", "Batch 1")
+    create_sample_product("b2", "Batch 2")
+
+    res = client.get("/products:batch", params={"ids": "b1,b2,nope"})
+    assert res.status_code == 200
+    data = res.json()
+    assert set(data["products"]) == {"b1", "b2"}
+    assert data["products"]["b2"]["product_name"] == "Batch 2"
+    assert data["missing"] == ["nope"]
+
+    res = client.post("/products:batch", json={"ids": ["b1", "b1"]})
+    assert list(res.json()["products"]) == ["b1"]
+    assert res.json()["missing"] == []